@@ -1,13 +1,23 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from .AIResponseTags import AiResponseTags
 
 import datetime
 import uuid
 
 class AiResponse(SQLModel, table=True):
+    __table_args__ = (
+        # Serves the keyset pagination of a user's feedback without sorting
+        Index("ix_airesponse_user_id_date_id", "user_id", "consulted_query_date", "id"),
+        # Delete and per-sentiment counts of a single upload
+        Index("ix_airesponse_upload_id_sentiment", "upload_id", "sentiment_prediction"),
+    )
+
     id: int | None = Field(primary_key=True, default=None)
     text: str
     sentiment_prediction: str
     consulted_query_date: datetime.datetime = Field(index=True)
     user_id: uuid.UUID
-    related_key:str|None = Field(default=None)
\ No newline at end of file
+    related_key:str|None = Field(default=None)
+    model_version:str|None = Field(default=None)
+    upload_id: int | None = Field(default=None, foreign_key="uploads.id")
\ No newline at end of file
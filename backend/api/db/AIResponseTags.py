@@ -1,11 +1,15 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 
 import datetime
 import uuid
 
 class AiResponseTags(SQLModel, table=True):
+    __table_args__ = (Index("ix_airesponsetags_user_id_tag", "user_id", "tag"),)
+
     tag: str|None = Field(default=None, index=True)
     consulted_query_date: datetime.datetime = Field(index=True)
     user_id: uuid.UUID
     related_key:str|None = Field(default=None)
-    key:str|None = Field(default=None, primary_key=True)
\ No newline at end of file
+    key:str|None = Field(default=None, primary_key=True)
+    upload_id: int | None = Field(default=None, foreign_key="uploads.id", index=True)
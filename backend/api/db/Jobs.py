@@ -0,0 +1,28 @@
+from sqlmodel import SQLModel, Field, Column, JSON
+
+import datetime
+import uuid
+
+class BaseJob(SQLModel):
+    kind: str = Field(default="upload")
+    status: str = Field(default="queued", index=True)
+    tag: str | None = Field(default=None)
+    rows_processed: int = Field(default=0)
+    stage_timings: dict = Field(default_factory=dict, sa_column=Column(JSON))
+    error: str | None = Field(default=None)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+    started_at: datetime.datetime | None = Field(default=None)
+    finished_at: datetime.datetime | None = Field(default=None)
+
+class Jobs(BaseJob, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    user_id: uuid.UUID = Field(index=True)
+    file_path: str | None = Field(default=None)
+    upload_id: int | None = Field(default=None)
+    cancel_requested: bool = Field(default=False)
+    heartbeat_at: datetime.datetime | None = Field(default=None)
+    # <host>:<pid>:<process start> of the API process running the job
+    worker: str | None = Field(default=None)
+
+class RetrieveJob(BaseJob):
+    id: uuid.UUID
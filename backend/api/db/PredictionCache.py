@@ -0,0 +1,7 @@
+from sqlmodel import SQLModel, Field
+
+class PredictionCache(SQLModel, table=True):
+    text_hash: str = Field(primary_key=True)
+    model_version: str = Field(primary_key=True)
+    text: str
+    sentiment_prediction: str
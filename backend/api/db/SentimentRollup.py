@@ -0,0 +1,9 @@
+from sqlmodel import SQLModel, Field
+
+import uuid
+
+class SentimentRollup(SQLModel, table=True):
+    user_id: uuid.UUID = Field(primary_key=True)
+    tag: str = Field(primary_key=True)
+    sentiment: str = Field(primary_key=True)
+    count: int = Field(default=0)
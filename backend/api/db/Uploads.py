@@ -0,0 +1,19 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+
+import datetime
+import uuid
+
+class Uploads(SQLModel, table=True):
+    # Archived uploads of a user, looked up by every filter request
+    __table_args__ = (Index("ix_uploads_user_id_archived_at", "user_id", "archived_at"),)
+
+    id: int | None = Field(primary_key=True, default=None)
+    user_id: uuid.UUID
+    consulted_query_date: datetime.datetime
+    model_version: str | None = Field(default=None)
+    # Set when its tag is deleted, the rows stay hidden until the purge job removes them
+    deleted_at: datetime.datetime | None = Field(default=None)
+    # Set when its rows were moved to a Parquet file, archive_path is relative to ARCHIVE_DIR
+    archived_at: datetime.datetime | None = Field(default=None)
+    archive_path: str | None = Field(default=None)
@@ -1,22 +1,109 @@
 from sqlmodel import create_engine, SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 import os 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from api.utils.metrics import instrument_engine
 from .Users import BaseUser, CreateUser, Users
+from .Uploads import Uploads
 from .AIResponse import AiResponse
 from .AIResponseTags import AiResponseTags
+from .Jobs import Jobs
+from .PredictionCache import PredictionCache
+from .SentimentRollup import SentimentRollup
 
 DATABASE_URL = os.getenv('DATABASE_URL')
+# Pool of each engine, per API worker
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+
+def async_database_url(url:str):
+    # Same database through the asyncio drivers: asyncpg for Postgres, aiosqlite for SQLite
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+asyncpg")
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL') or async_database_url(DATABASE_URL)
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+    "pool_recycle": DB_POOL_RECYCLE,
+}
 
 engine = create_engine(
     DATABASE_URL, 
+    **pool_options,
 )
 
+# Used by the routes that only query; uploads, jobs and the startup keep the synchronous engine
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **pool_options,
+)
+
+# Statement timings of both engines on /metrics
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def set_sqlite_wal(dbapi_connection, connection_record):
+        # Readers don't wait for a running upload transaction on WAL mode
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
 def get_session():
     with Session(engine) as session:
         yield session
 
+async def get_async_session():
+    # Loaded objects stay readable after commit without another round trip
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
 def create_all_table_and_db():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    if engine.dialect.name == "postgresql":
+        create_partitioned_tables()
+    SQLModel.metadata.create_all(engine)
+    add_missing_columns()
+    # Imported here, it depends on the models of this package
+    from api.utils.text_search import check_text_search_index
+    with engine.begin() as connection:
+        check_text_search_index(connection)
+
+def add_missing_columns():
+    # create_all skips tables that already exist, so columns and indexes added to a model later are created here
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+
+def create_partitioned_tables():
+    """Creates airesponse partitioned by month on Postgres, once the tables it references exist."""
+    # Imported here, it depends on the models of this package
+    from api.utils.partitions import create_partitioned_table, ensure_partitions, table_kind
+    SQLModel.metadata.create_all(engine, tables=[table for table in SQLModel.metadata.sorted_tables if table.name != AiResponse.__tablename__])
+    with engine.begin() as connection:
+        if not create_partitioned_table(connection) and table_kind(connection) == "p":
+            # Months ahead, for the workers that stay up past the last created one
+            ensure_partitions(connection)
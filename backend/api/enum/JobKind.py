@@ -0,0 +1,5 @@
+from enum import Enum
+
+class JobKind(Enum):
+    upload = "upload"
+    purge = "purge"
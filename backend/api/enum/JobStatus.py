@@ -0,0 +1,8 @@
+from enum import Enum
+
+class JobStatus(Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+    cancelled = "cancelled"
@@ -3,4 +3,6 @@ from enum import Enum
 class TagsEnum(Enum):
     users = "Users"
     auth = "Auth"
-    search = "Search"
\ No newline at end of file
+    search = "Search"
+    jobs = "Jobs"
+    models = "Models"
\ No newline at end of file
@@ -1,12 +1,16 @@
-from fastapi import FastAPI, Depends, Header, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Annotated
 from sqlmodel import Session
 
-from api.routers import auth, Users, Search
-from api.db import create_all_table_and_db, get_session
-from api.utils.token import decode_token, protected_endpoint
+from api.routers import auth, Users, Search, Jobs, Models
+from api.db import create_all_table_and_db, get_session, async_engine
+from api.routers.auth import current_user_dependency
 from api.utils.create_admin import create_admin
+from api.utils.inference import shutdown_pool
+from api.utils.blocking import shutdown_blocking_executor
+from api.utils.jobs import resume_jobs, shutdown_executor
+from api.utils.metrics import MetricsMiddleware, render_metrics, METRICS_CONTENT_TYPE
 import uvicorn
 
 description = """
@@ -37,19 +41,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination of /search/input/filter/ is sent on headers
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
+# Added last so it wraps CORS too and times the whole request
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth.router, prefix="/api")
 app.include_router(Users.router, prefix="/api")
 app.include_router(Search.router, prefix="/api")
+app.include_router(Jobs.router, prefix="/api")
+app.include_router(Models.router, prefix="/api")
 
 @app.on_event("startup")
 def creating_on_startup():
     create_all_table_and_db()
     create_admin()
+    resume_jobs()
+
+@app.on_event("shutdown")
+async def stopping_workers():
+    shutdown_executor()
+    shutdown_pool()
+    shutdown_blocking_executor()
+    await async_engine.dispose()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Prometheus text format, scraped without authentication
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/api")
-def root(token: Annotated[protected_endpoint, Depends()]):
+async def root(user: current_user_dependency):
     return {"Message": "Hello World!"}
 
 if __name__ == "__main__":
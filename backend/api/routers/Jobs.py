@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, Path, HTTPException, status
+from typing import Annotated
+from sqlmodel import Session, select
+
+from uuid import UUID
+
+from ..db import get_session
+from ..db.Jobs import Jobs, RetrieveJob
+from ..enum.TagsEnum import TagsEnum
+from api.utils.jobs import get_job_progress, cancel_job, FINISHED_STATUS
+from api.enum.JobKind import JobKind
+from api.utils.ingest import is_database_locked_error
+from api.utils.response_helper import database_busy
+from .auth import current_user_dependency
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=[TagsEnum.jobs]
+)
+
+session_dependency = Annotated[Session, Depends(get_session)]
+
+def get_user_job(session:Session, job_id:str, user:dict):
+    try:
+        job_uuid = UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Job ID must be an UUID string")
+    job = session.get(Jobs, job_uuid)
+    if not job or str(job.user_id) != str(user.get("id")):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not founded")
+    return job
+
+@router.get('/', response_model=list[RetrieveJob], status_code=status.HTTP_200_OK)
+def list_jobs(session: session_dependency, user: current_user_dependency):
+    statement = select(Jobs).where(Jobs.user_id == UUID(user.get("id"))).order_by(Jobs.created_at.desc())
+    return [get_job_progress(job) for job in session.exec(statement).all()]
+
+@router.get('/{job_id}', response_model=RetrieveJob, status_code=status.HTTP_200_OK)
+def retrieve_job(job_id:Annotated[str, Path()], session: session_dependency, user: current_user_dependency):
+    return get_job_progress(get_user_job(session, job_id, user))
+
+@router.post('/{job_id}/cancel', status_code=status.HTTP_202_ACCEPTED)
+def cancel(job_id:Annotated[str, Path()], session: session_dependency, user: current_user_dependency):
+    job = get_user_job(session, job_id, user)
+    if job.status in FINISHED_STATUS:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job already {job.status}")
+    if job.kind == JobKind.purge.value:
+        # The tag is already gone, stopping would only leave its rows behind
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Deletions can't be cancelled")
+    try:
+        cancelled = cancel_job(session, job)
+    except Exception as e:
+        if is_database_locked_error(e):
+            raise database_busy()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    if not cancelled:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job already finishing")
+    return {"message": "Cancellation requested", "job_id": str(job.id)}
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, Body, HTTPException, status
+from typing import Annotated
+from sqlmodel import Session
+
+from ..enum.TagsEnum import TagsEnum
+from api.utils.model_registry import list_versions, get_active_model, activate_version, ModelVersionNotFound
+from api.utils.prediction_cache import prediction_cache
+from ..db import get_session
+from .auth import admin_user_dependency
+
+router = APIRouter(
+    prefix="/models",
+    tags=[TagsEnum.models]
+)
+
+session_dependency = Annotated[Session, Depends(get_session)]
+
+@router.get('/', status_code=status.HTTP_200_OK)
+def retrieve_versions(user: admin_user_dependency):
+    return {"active": get_active_model().version, "versions": list_versions()}
+
+@router.post('/activate', status_code=status.HTTP_200_OK)
+def activate(version:Annotated[str, Body(embed=True)], session: session_dependency, user: admin_user_dependency):
+    try:
+        loaded = activate_version(version)
+        # Entries are keyed by version, dropping the others only frees the space they take
+        prediction_cache.invalidate(session, keep_version=loaded.version)
+    except ModelVersionNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    return {"message": "Model version activated", "active": loaded.version}
+
+@router.get('/cache', status_code=status.HTTP_200_OK)
+def cache_stats(user: admin_user_dependency):
+    return prediction_cache.stats()
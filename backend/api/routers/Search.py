@@ -1,26 +1,33 @@
-from fastapi import APIRouter, File, UploadFile, Body, Depends, Query, Path, Header, HTTPException, status
+from fastapi import APIRouter, File, UploadFile, Body, Depends, Query, Path, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from typing import Annotated, Union
-import pandas as pd
-from sqlmodel import Session, select, text
-from sqlalchemy import func, delete
-from pydantic import BaseModel
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
-import os
 
-import joblib
 import uuid
 
 
 from ..enum.TagsEnum import TagsEnum
 from ..enum.DateOperator import DateOperator
-from ml_model.preprocess import clear_text
-from ..db import get_session
-from ..db.AIResponse import AiResponse
+from ..enum.ExportFormat import ExportFormat
+from ..db import get_session, get_async_session
 from ..db.AIResponseTags import AiResponseTags
-from api.utils.operators import convert_text_to_operator
-from api.utils.query_helper import build_where_clause
-from api.utils.token import decode_token
-from .auth import o_auth_pass_bearer
+from api.utils.query_helper import build_filter_query, build_filter_count, build_export_query
+from api.utils.text_search import keyword_query, build_search_query
+from api.utils.export import export_rows, export_filename, export_media_type
+from api.utils.purge import mark_tag_deleted, TagNotFound
+from api.utils.rollup import rollup_query
+from api.utils.archive import build_archived_uploads_query, build_archived_count, read_archived_rows, merge_page
+from api.utils.pagination import encode_cursor, decode_cursor, InvalidCursor
+from api.utils.model_registry import get_active_model
+from api.utils.jobs import enqueue_upload, submit_job
+from api.utils.blocking import run_blocking
+from api.utils.ingest import ingest_file, is_duplicated_tag_error, is_database_locked_error, split_extension, ACCEPTED_EXTENSIONS, INGEST_SAMPLE_SIZE
+from api.utils.response_helper import database_busy
+from api.utils.xlsx_reader import MissingColumnError
+from api.utils.metrics import timed_stage
+from .auth import current_user_dependency
 
 
 router = APIRouter(
@@ -28,79 +35,100 @@ router = APIRouter(
     tags=[TagsEnum.search]
 )
 
-model = joblib.load('ml_model/model/modelo_sentimento.pkl') 
-vectorizer = joblib.load('ml_model/model/vectorizer.pkl') 
-session_dependency = Annotated[Session, Depends(get_session)]
+session_dependency = Annotated[AsyncSession, Depends(get_async_session)]
+# Uploads go through the synchronous ingest pipeline, run on the blocking executor
+sync_session_dependency = Annotated[Session, Depends(get_session)]
 
 
 @router.post('/input', status_code=status.HTTP_201_CREATED)
-async def upload_file(file: Annotated[UploadFile, File()], session: session_dependency, token: Annotated[str, Depends(o_auth_pass_bearer)]):
-    extension = os.path.splitext(file.filename)[1].lower()
-    
-    extension = str(extension)
-    if (extension == ".csv"):
-        df = pd.read_csv(file.file)
-    elif (extension == ".xlsx"):
-        df = pd.read_excel(file.file)
-    else :
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only '.csv' and '.xlsx' files available")
-    try:
-        today = datetime.now()
-        
-
-        df['Text'] = df['Text'].apply(clear_text)
-
-        X = vectorizer.transform(df['Text'])
-        df['Sentiment_Prediction'] = model.predict(X)
-        df_table = df.copy()
-        result = df[['Text', 'Sentiment_Prediction']].to_dict(orient='records')
-
-
-        df_table.rename({"Text":"text", "Sentiment_Prediction":"sentiment_prediction"}, axis=1, inplace=True)
-        df_table["consulted_query_date"] = today
-
-        user = decode_token(token)
-        user_id = str(user.get("id"))
+async def upload_file(
+    file: Annotated[UploadFile, File()], 
+    session: sync_session_dependency, 
+    user: current_user_dependency,
+    response: Response,
+    stream: Annotated[bool, Query()] = False,
+    background: Annotated[bool, Query()] = False,
+    ):
+    file_name, extension = split_extension(file.filename)
+    if extension not in ACCEPTED_EXTENSIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Only {', '.join(repr(accepted) for accepted in ACCEPTED_EXTENSIONS)} files available")
+    user_id = uuid.UUID(str(user.get("id")))
+    # Parsing, classifying and storing would hold the event loop for the whole upload
+    return await run_blocking(store_upload, session, file, extension, file_name, user_id, response, stream, background)
 
-        df_table["user_id"] = uuid.UUID(user_id)
-        df_table["related_key"] = df_table["user_id"].astype(str) + df_table["consulted_query_date"].astype(str)
-        df_table_dict = df_table.to_dict(orient='records')
-        session.bulk_insert_mappings(AiResponse, df_table_dict)
-
-        file_name = os.path.splitext(file.filename)[0]
-        dict_tag_prediction = {
-            "consulted_query_date" : today,
-            "tag" : file_name,
-            "user_id" : uuid.UUID(user_id),
-            "related_key" : f"{str(user_id)}{str(today)}",
-            "key" : f"{str(user_id)}{str(file_name)}"
-        }
-        dict_to_db = AiResponseTags.model_validate(dict_tag_prediction)
-        session.add(dict_to_db)
+def store_upload(session:Session, file:UploadFile, extension:str, file_name:str, user_id:uuid.UUID, response:Response, stream:bool, background:bool):
+    if background:
+        # The job runs the same pipeline on a worker thread, follow it on /api/jobs/{job_id}
+        if session.get(AiResponseTags, f"{str(user_id)}{str(file_name)}"):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tag/Document name already analyzed. Please choose another or rename it")
+        try:
+            job = enqueue_upload(session, file.file, file.filename, user_id)
+        except Exception as e:
+            if is_database_locked_error(e):
+                raise database_busy()
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "queued", "job_id": str(job.id)}
 
+    try:
+        # On stream mode only a bounded sample is kept, so memory depends on the chunk size and not on the file size
+        sample_size = INGEST_SAMPLE_SIZE if stream else None
+        dict_to_db, rows, result = ingest_file(session, file.file, extension, file_name, user_id, get_active_model(), sample_size=sample_size)
     
-        session.commit()
+        with timed_stage("commit"):
+            session.commit()
+    except MissingColumnError as e:
+        session.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e :
-        if "UNIQUE constraint failed: airesponsetags.key" in str(e):
+        session.rollback()
+        if is_duplicated_tag_error(e):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tag/Document name already analyzed. Please choose another or rename it")
+        if is_database_locked_error(e):
+            raise database_busy()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
     
     session.refresh(dict_to_db)
-    return {"message": "success", "sample": result}
+    return {"message": "success", "rows": rows, "sample": result}
 
-@router.post('/find')
-async def find_feedback(keywords:Annotated[list[str], Body()]):
-    # ALL THE AI LOGIC HERE
-    return {"message": "We are searching for feedbacks for you, please wait until finish!", "keywords": keywords}
+@router.post('/find', status_code=status.HTTP_200_OK)
+async def find_feedback(
+    keywords:Annotated[list[str], Body()],
+    session: session_dependency,
+    user: current_user_dependency,
+    tag:Annotated[list[str] | None, Query()] = None,
+    sentiment:Annotated[Union[str, None], Query(regex="^(positivo|negativo|neutro)$", )] = None,
+    items_per_page:Annotated[int, Query(ge=1)] = 10,
+    page:Annotated[int, Query(ge=1)] = 1,
+    date:Annotated[str | None, Query()] = None,
+    date_operator:Annotated[DateOperator | None, Query()] = None,
+    ):
+    """
+    Feedback containing any of `keywords` (each one a word or a phrase), best
+    matches first, read from the full-text index. Filters as on /input/filter/.
+    """
+    search = keyword_query(keywords)
+    if not search:
+        return []
+    params, date_operator = filter_params(user, tag, sentiment, date, date_operator)
+    params.update({"query": search, "limit": items_per_page, "offset": (page-1)*items_per_page})
+    query = build_search_query(session.bind.dialect.name, date_operator, bool(sentiment), bool(tag))
 
-@router.get('/input/group/', status_code=status.HTTP_200_OK)
-def results_by_day(session: session_dependency, token: Annotated[str, Depends(o_auth_pass_bearer)]):
     try:
-        user = decode_token(token.removeprefix("bearer ").removeprefix("Bearer "))
-        user_id = str(user.get("id"))
-        statment = f"""SELECT tag, sentiment_prediction, count(*)  FROM airesponse LEFT JOIN airesponsetags on airesponse.consulted_query_date = airesponsetags.consulted_query_date WHERE airesponse.user_id = '{user_id.replace('-', '')}' GROUP BY sentiment_prediction, tag """
+        results = (await session.execute(query, params)).all()
+        return [
+            {"date": result[0], "sentiment": result[1], "text": result[2], "tag": result[3], "rank": result[4]}
+            for result in results
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-        results = session.execute(text(statment)).all()
+@router.get('/input/group/', status_code=status.HTTP_200_OK)
+async def results_by_day(session: session_dependency, user: current_user_dependency):
+    try:
+        user_id = uuid.UUID(str(user.get("id")))
+        # Kept up to date by every upload and delete, so it never touches airesponse
+        results = (await session.execute(rollup_query(user_id))).all()
 
         to_return = [
             {"tag": result[0], "sentiment": result[1], "count": result[2]}
@@ -111,74 +139,143 @@ def results_by_day(session: session_dependency, token: Annotated[str, Depends(o_
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.get('/input/distinct_tag', status_code=status.HTTP_200_OK)
-def distinct_tag(session: session_dependency, token: Annotated[str, Depends(o_auth_pass_bearer)]):
+async def distinct_tag(session: session_dependency, user: current_user_dependency):
     try :
-        user = decode_token(token)
         user_id = str(user.get("id"))
-        result = session.execute(text(f"SELECT DISTINCT tag FROM AiResponseTags WHERE user_id='{user_id.replace('-', '')}'"))
+        result = await session.execute(select(AiResponseTags.tag).distinct().where(AiResponseTags.user_id == uuid.UUID(user_id)))
         return [i[0] for i in result.all()]
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@router.post('/input/filter/', status_code=status.HTTP_200_OK)
-def filter_inputted(
-    session: session_dependency, 
-    token: Annotated[str, Depends(o_auth_pass_bearer)],
-    tags: Annotated[dict[str,list[str]] | None, Body()] = None,
-    sentiment:Annotated[Union[str, None], Query(regex="^(positivo|negativo|neutro)$", )] = None, 
-    items_per_page:Annotated[int, Query()] = 10, 
-    page:Annotated[int, Query()] = 1,
-    date:Annotated[str | None, Query()] = None, 
-    date_operator:Annotated[DateOperator | None, Query()] = None, 
-    ):
-    user = decode_token(token)
-    user_id = str(user.get("id"))
-
+def filter_params(user:dict, tags:list[str] | None, sentiment:str | None, date:str | None, date_operator:DateOperator | None):
+    """Bound parameters of the filters shared by filter and export, and the date operator to build the query with."""
     if (date and not date_operator) or (date_operator and not date) :
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Please provide operator and data to filter - operators: [gte, gt, e, lt, lte]")
 
-
-    filters = {}
+    params = {"user_id": uuid.UUID(str(user.get("id")))}
     if date and date_operator:
-        filters["airesponse.consulted_query_date"] = {"operator": date_operator.value, "value": date}
+        try:
+            params["date"] = datetime.fromisoformat(date)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid date: {date}")
+    else:
+        date_operator = None
     if sentiment:
-        filters["sentiment_prediction"] = [sentiment]
+        params["sentiments"] = [sentiment]
+    if tags is not None:
+        params["tags"] = tags
+    return params, date_operator
+
+def tag_list(tags:dict[str,list[str]] | None):
+    # Tags of filter and export come on a body like {"tag": [...]}
     if tags:
         tags_dict_key = list(tags.keys())[0]
-        filters['tag'] = tags[tags_dict_key]
-    filters['airesponse.user_id'] = [user_id.replace('-', '')]
+        return tags[tags_dict_key]
+    return None
 
-    where_clause = build_where_clause(**filters)
-    
-    statment = f"SELECT airesponse.consulted_query_date, airesponse.sentiment_prediction, airesponse.text, airesponsetags.tag FROM airesponse LEFT JOIN airesponsetags on airesponse.consulted_query_date = airesponsetags.consulted_query_date {where_clause if where_clause else ''}"
+@router.post('/input/filter/', status_code=status.HTTP_200_OK)
+async def filter_inputted(
+    session: session_dependency, 
+    user: current_user_dependency,
+    response: Response,
+    tags: Annotated[dict[str,list[str]] | None, Body()] = None,
+    sentiment:Annotated[Union[str, None], Query(regex="^(positivo|negativo|neutro)$", )] = None, 
+    items_per_page:Annotated[int, Query(ge=1)] = 10, 
+    page:Annotated[int, Query(ge=1)] = 1,
+    date:Annotated[str | None, Query()] = None, 
+    date_operator:Annotated[DateOperator | None, Query()] = None, 
+    cursor:Annotated[str | None, Query()] = None,
+    with_total:Annotated[bool, Query()] = False,
+    ):
+    """
+    Rows come ordered by (consulted_query_date, id). The X-Next-Cursor header
+    holds the cursor of the next page, sent back on `cursor` instead of `page`,
+    so every page is read straight from the index. `with_total` adds the
+    X-Total-Count header, counted on a separate query. Rows of archived
+    uploads are read from their Parquet files and merged in the same order.
+    """
+    params, date_operator = filter_params(user, tag_list(tags), sentiment, date, date_operator)
+    params["limit"] = items_per_page + 1
+
+    if cursor:
+        try:
+            params["cursor_date"], params["cursor_id"] = decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    else:
+        # Without a cursor the page number still works, skipped on the database side
+        params["offset"] = (page-1)*items_per_page
+    query = build_filter_query(date_operator, bool(sentiment), bool(tags), bool(cursor))
 
     try:
-        results = session.execute(text(statment)).all()
+        archived = (await session.execute(build_archived_uploads_query(date_operator, bool(tags)), params)).all()
+        offset = params.get("offset", 0)
+        if archived and not cursor:
+            # Both sides are read up to the end of the page, then merged
+            params.update(offset=0, limit=offset + params["limit"])
+        # One extra row tells whether there is a next page
+        results = (await session.execute(query, params)).all()
+        if archived:
+            after = (params["cursor_date"], params["cursor_id"]) if cursor else None
+            archived_rows = await run_blocking(read_archived_rows, archived, params.get("sentiments"), after, offset + items_per_page + 1)
+            results = merge_page(results, archived_rows, offset, items_per_page + 1)
+        if len(results) > items_per_page:
+            results = results[:items_per_page]
+            response.headers["X-Next-Cursor"] = encode_cursor(results[-1][0], results[-1][4])
+        if with_total:
+            count = build_filter_count(date_operator, bool(sentiment), bool(tags))
+            total = (await session.execute(count, params)).scalar_one()
+            if archived:
+                total += (await session.execute(build_archived_count(date_operator, bool(sentiment), bool(tags)), params)).scalar_one()
+            response.headers["X-Total-Count"] = str(total)
         to_return = [
         {"date": result[0], "sentiment": result[1], "text": result[2], "tag" : result[3]}
-        for result in results[(page-1)*items_per_page:page*items_per_page]
+        for result in results
         ]
         return to_return
     except Exception as e:
         print(e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@router.delete('/input/delete/{tag}', status_code=status.HTTP_204_NO_CONTENT)
-def delete_response(session:session_dependency, tag:Annotated[str, Path()], token: Annotated[str, Depends(o_auth_pass_bearer)]):
+@router.post('/input/export/', status_code=status.HTTP_200_OK)
+async def export_inputted(
+    user: current_user_dependency,
+    tags: Annotated[dict[str,list[str]] | None, Body()] = None,
+    sentiment:Annotated[Union[str, None], Query(regex="^(positivo|negativo|neutro)$", )] = None, 
+    date:Annotated[str | None, Query()] = None, 
+    date_operator:Annotated[DateOperator | None, Query()] = None, 
+    format:Annotated[ExportFormat, Query()] = ExportFormat.csv,
+    gzip:Annotated[bool, Query()] = False,
+    ):
+    """
+    Every entry matching the same filters as /input/filter/, streamed as a
+    file in the order of its pages. `gzip` compresses CSV and NDJSON into a
+    .gz file, and selects the gzip codec inside Parquet files.
+    """
+    params, date_operator = filter_params(user, tag_list(tags), sentiment, date, date_operator)
+    query = build_export_query(date_operator, bool(sentiment), bool(tags))
+    return StreamingResponse(
+        export_rows(query, params, format, gzip),
+        media_type=export_media_type(format, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format, gzip)}"'},
+    )
+
+@router.delete('/input/delete/{tag}', status_code=status.HTTP_202_ACCEPTED)
+async def delete_response(session:session_dependency, tag:Annotated[str, Path()], user: current_user_dependency):
+    """
+    The tag disappears at once from every listing, its rows are deleted in
+    batches by a background job, followed on /api/jobs/{job_id}.
+    """
     try :
-        user = decode_token(token)
         user_id = user.get("id")
-
-        statment_airesponsetags = select(AiResponseTags.related_key).where(AiResponseTags.tag == tag).where(AiResponseTags.user_id == uuid.UUID(user_id))
-
-        related_key = session.execute(statment_airesponsetags).one()[0]
-
-        statment_airesponse = delete(AiResponse).where(AiResponse.related_key == related_key)
-        statment_airesponsetags = delete(AiResponseTags).where(AiResponseTags.related_key == related_key)
-        session.execute(statment_airesponse)
-        session.execute(statment_airesponsetags)
-        
-        session.commit()
-    
+        job = await session.run_sync(mark_tag_deleted, uuid.UUID(user_id), tag)
+        await session.commit()
+    except TagNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        if is_database_locked_error(e):
+            raise database_busy()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    submit_job(job.id, job.kind)
+    return {"message": "deleting", "job_id": str(job.id)}
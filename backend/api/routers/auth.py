@@ -2,12 +2,15 @@ from fastapi import Depends, APIRouter, HTTPException, Body, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 from typing import Annotated
+import jwt
 
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..db import get_session
+from ..db import get_async_session
 from ..db.Users import Users, CreateUser, UserIn
-from ..utils.token import verify_password, create_token, decode_token
+from ..utils.token import verify_password, create_token, decode_token, token_cache
+from ..utils.blocking import run_blocking
 from ..enum.TagsEnum import TagsEnum
 
 router = APIRouter(
@@ -17,16 +20,38 @@ router = APIRouter(
 
 o_auth_pass_bearer = OAuth2PasswordBearer(tokenUrl="/api/auth/login/swagger")
 
-session_dependency = Annotated[Session, Depends(get_session)] # Help on database management
+session_dependency = Annotated[AsyncSession, Depends(get_async_session)] # Help on database management
+
+# Async dependencies run on the event loop instead of taking a thread of the pool on every request
+async def get_current_user(token: Annotated[str, Depends(o_auth_pass_bearer)]):
+    """Claims of the request token. FastAPI caches a dependency per request, so it is decoded once however many ask for it."""
+    try:
+        return decode_token(token)
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+
+current_user_dependency = Annotated[dict, Depends(get_current_user)]
+
+async def get_admin_user(user: current_user_dependency):
+    if not user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin permission required!")
+    return user
+
+admin_user_dependency = Annotated[dict, Depends(get_admin_user)]
+
+async def authenticate(session:AsyncSession, email:str, password:str):
+    statement = select(Users).where(Users.email == email)
+    user_instance = (await session.exec(statement)).one_or_none()
+    # bcrypt alone takes hundreds of milliseconds, it would hold the event loop
+    if not user_instance or not await run_blocking(verify_password, password, user_instance.password):
+        return None
+    return user_instance
 
 @router.post('/login/swagger', status_code=status.HTTP_200_OK)
-def login_user_swagger(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], session: session_dependency):
-    statement = select(Users).where(Users.email == str(form_data.username).replace("\t",""))
-    user_instance = session.exec(statement).one_or_none()
+async def login_user_swagger(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], session: session_dependency):
+    user_instance = await authenticate(session, str(form_data.username).replace("\t",""), form_data.password)
     if not user_instance:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User or Password Incorrect")
-    if not verify_password(form_data.password, user_instance.password):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User or Password Incorrect")
     token = create_token({
                 "username": user_instance.username, 
                 "cpf" : user_instance.cpf,
@@ -41,31 +66,30 @@ def login_user_swagger(form_data: Annotated[OAuth2PasswordRequestForm, Depends()
     return {"access_token" : f"Bearer {token}", "token_type": "bearer"}
         
 
-@router.get('/test-auth', dependencies=[Depends(o_auth_pass_bearer)])
-def auth(token: Annotated[str, Depends(o_auth_pass_bearer)]):
+@router.get('/test-auth')
+async def auth(user: current_user_dependency):
     return  {"detail" : "You are now authenticated!"}
 
+@router.get('/cache', status_code=status.HTTP_200_OK)
+async def token_cache_stats(user: admin_user_dependency):
+    return token_cache.stats()
+
 @router.post('/login', status_code=status.HTTP_200_OK)
 async def login_user(user: Annotated[UserIn, Body()], session: session_dependency):
-    statement = select(Users).where(Users.email == user.email)
-    user_instance = session.exec(statement).one_or_none()
-    if(user_instance) :
-        if not verify_password(user.password, user_instance.password) :
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User or Password Incorrect")
-        token = create_token({
-                    "username": user_instance.username, 
-                    "cpf" : user_instance.cpf,
-                    "name" : user_instance.name,
-                    "company_name" : user_instance.company_name,
-                    "id" : str(user_instance.id),
-                    "email" : user_instance.email,
-                    "cnpj" : user_instance.cnpj,
-                    "company_type" : user_instance.company_type,
-                    "is_admin": user_instance.is_admin
-                    })
-        return {
-            "access_token" : f"Bearer {token}", 
-            "token_type": "bearer"}
-    else :
+    user_instance = await authenticate(session, user.email, user.password)
+    if not user_instance :
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User or Password Incorrect")
-    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User or Password Incorrect")
+    token = create_token({
+                "username": user_instance.username, 
+                "cpf" : user_instance.cpf,
+                "name" : user_instance.name,
+                "company_name" : user_instance.company_name,
+                "id" : str(user_instance.id),
+                "email" : user_instance.email,
+                "cnpj" : user_instance.cnpj,
+                "company_type" : user_instance.company_type,
+                "is_admin": user_instance.is_admin
+                })
+    return {
+        "access_token" : f"Bearer {token}", 
+        "token_type": "bearer"}
@@ -0,0 +1,239 @@
+import os
+from dotenv import load_dotenv
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+import heapq
+import itertools
+import uuid
+
+from sqlmodel import Session, select
+from sqlalchemy import DateTime, bindparam, exists, func
+
+from api.db import engine
+from api.db.AIResponse import AiResponse
+from api.db.AIResponseTags import AiResponseTags
+from api.db.Uploads import Uploads
+from api.db.SentimentRollup import SentimentRollup
+from api.enum.DateOperator import DateOperator
+from api.utils.operators import convert_date_operator
+from api.utils.purge import delete_upload_rows
+
+load_dotenv()
+
+# Uploads older than this are moved to Parquet files by every archive run
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+ARCHIVE_COMPRESSION = os.getenv('ARCHIVE_COMPRESSION', 'zstd')
+# Rows read, written as one row group and deleted at a time
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 10000))
+
+_ARCHIVED_COLUMNS = (AiResponse.id, AiResponse.consulted_query_date, AiResponse.sentiment_prediction, AiResponse.text, AiResponse.related_key, AiResponse.model_version)
+
+def _schema():
+    # Only needed to write and read archives
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("consulted_query_date", pa.timestamp("us")),
+        ("sentiment_prediction", pa.string()),
+        ("text", pa.string()),
+        ("related_key", pa.string()),
+        ("model_version", pa.string()),
+    ])
+
+def archive_file(archive_path:str):
+    return os.path.join(ARCHIVE_DIR, archive_path)
+
+def remove_archive(archive_path:str | None):
+    if archive_path and os.path.exists(archive_file(archive_path)):
+        os.remove(archive_file(archive_path))
+
+def write_archive(session:Session, upload:Uploads, batch_size:int = ARCHIVE_BATCH_SIZE):
+    """Writes the rows of `upload` to a Parquet file, ordered by id. Returns its archive_path and the rows written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    archive_path = os.path.join(str(upload.user_id), f"{upload.id}.parquet")
+    path = archive_file(archive_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    schema = _schema()
+    rows = 0
+    statement = select(*_ARCHIVED_COLUMNS).where(AiResponse.upload_id == upload.id).order_by(AiResponse.id).execution_options(yield_per=batch_size)
+    with pq.ParquetWriter(temporary_path, schema, compression=ARCHIVE_COMPRESSION) as writer:
+        for batch in session.execute(statement).partitions():
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+            rows += len(batch)
+    # Complete files only, a stopped run leaves a .tmp behind and the rows in place
+    os.replace(temporary_path, path)
+    return archive_path, rows
+
+def archive_upload(upload_id:int, batch_size:int = ARCHIVE_BATCH_SIZE):
+    """
+    Moves the rows of an upload to its Parquet file. The file is written and
+    the upload flagged first, so reads go to the file from then on, and the
+    rows are deleted in batches after. On an upload already flagged only the
+    rows left are deleted. Returns the rows deleted.
+    """
+    deleted = 0
+    with Session(engine) as session:
+        upload = session.get(Uploads, upload_id)
+        if upload.archived_at is None:
+            upload.archive_path, _ = write_archive(session, upload, batch_size)
+            upload.archived_at = datetime.now()
+            session.commit()
+        while True:
+            batch = delete_upload_rows(session, upload_id, batch_size)
+            session.commit()
+            if not batch:
+                return deleted
+            deleted += batch
+
+def uploads_to_archive(session:Session, before:datetime):
+    """Ids of the uploads stored before `before`, then of the archived ones a stopped run left rows of."""
+    old = session.exec(
+        select(Uploads.id)
+        .where(Uploads.consulted_query_date < before, Uploads.archived_at == None, Uploads.deleted_at == None)
+        .order_by(Uploads.id)
+    ).all()
+    unfinished = session.exec(
+        select(Uploads.id)
+        .where(Uploads.archived_at != None, Uploads.deleted_at == None, exists().where(AiResponse.upload_id == Uploads.id))
+        .order_by(Uploads.id)
+    ).all()
+    return list(old) + list(unfinished)
+
+def archive_old_uploads(older_than_days:int = ARCHIVE_AFTER_DAYS, batch_size:int = ARCHIVE_BATCH_SIZE):
+    """Archives every upload older than `older_than_days`. Returns the uploads archived and the rows moved."""
+    before = datetime.now() - timedelta(days=older_than_days)
+    with Session(engine) as session:
+        upload_ids = uploads_to_archive(session, before)
+    rows = 0
+    for upload_id in upload_ids:
+        rows += archive_upload(upload_id, batch_size)
+        print(f"upload {upload_id} archived, {rows} rows moved")
+
+    if engine.dialect.name == "postgresql":
+        from api.utils.partitions import ensure_partitions, drop_empty_partitions, table_kind
+        with engine.begin() as connection:
+            if table_kind(connection) == "p":
+                ensure_partitions(connection)
+                for name in drop_empty_partitions(connection, before):
+                    print(f"{name} dropped")
+    return len(upload_ids), rows
+
+def _archived_conditions(date_operator:DateOperator | None, tags:bool):
+    conditions = [Uploads.user_id == bindparam("user_id"), Uploads.archived_at != None, Uploads.deleted_at == None]
+    # Every row of an upload has the upload's date, so the date filter is applied to the upload
+    if date_operator:
+        conditions.append(convert_date_operator(date_operator)(Uploads.consulted_query_date, bindparam("date", type_=DateTime)))
+    if tags:
+        conditions.append(AiResponseTags.tag.in_(bindparam("tags", expanding=True)))
+    return conditions
+
+@lru_cache(maxsize=None)
+def build_archived_uploads_query(date_operator:DateOperator | None, tags:bool):
+    """(consulted_query_date, archive_path, tag) of the archived uploads matching the filters of build_filter_query."""
+    return (
+        select(Uploads.consulted_query_date, Uploads.archive_path, AiResponseTags.tag)
+        .outerjoin(AiResponseTags, AiResponseTags.upload_id == Uploads.id)
+        .where(*_archived_conditions(date_operator, tags))
+        .order_by(Uploads.consulted_query_date, Uploads.id)
+    )
+
+@lru_cache(maxsize=None)
+def build_archived_count(date_operator:DateOperator | None, sentiment:bool, tags:bool):
+    """Rows of the archived uploads matching the filters, summed from the sentiment rollup instead of read from the files."""
+    conditions = _archived_conditions(date_operator, tags)
+    if sentiment:
+        conditions.append(SentimentRollup.sentiment.in_(bindparam("sentiments", expanding=True)))
+    return (
+        select(func.coalesce(func.sum(SentimentRollup.count), 0))
+        .select_from(Uploads)
+        .join(AiResponseTags, AiResponseTags.upload_id == Uploads.id)
+        .join(SentimentRollup, (SentimentRollup.user_id == Uploads.user_id) & (SentimentRollup.tag == AiResponseTags.tag))
+        .where(*conditions)
+    )
+
+def read_archived_rows(uploads:list, sentiments:list[str] | None = None, after:tuple | None = None, limit:int | None = None):
+    """
+    Rows of the archived `uploads` (rows of build_archived_uploads_query) as
+    (date, sentiment, text, tag, id), ordered by (date, id) like the stored
+    ones: only the sentiments in `sentiments`, after the (date, id) `after`
+    cursor, and at most `limit`. Files are only read up to the rows needed,
+    and their row groups skipped on their id statistics.
+    """
+    import pyarrow.dataset as ds
+
+    rows = []
+    last_date = None
+    for date, archive_path, tag in uploads:
+        if after and date < after[0]:
+            continue
+        # Files come by date, the ones after a full page can't be on it
+        if limit is not None and len(rows) >= limit and date > last_date:
+            break
+        expression = None
+        if sentiments:
+            expression = ds.field("sentiment_prediction").isin(sentiments)
+        if after and date == after[0]:
+            after_cursor = ds.field("id") > after[1]
+            expression = after_cursor if expression is None else expression & after_cursor
+
+        scanner = ds.dataset(archive_file(archive_path), format="parquet").scanner(
+            columns=["id", "sentiment_prediction", "text"], filter=expression, use_threads=False,
+        )
+        read = 0
+        for batch in scanner.to_batches():
+            columns = batch.to_pydict()
+            rows.extend((date, sentiment, text, tag, id) for id, sentiment, text in zip(columns["id"], columns["sentiment_prediction"], columns["text"]))
+            read += batch.num_rows
+            # Ordered by id inside the file
+            if limit is not None and read >= limit:
+                break
+        last_date = date
+
+    rows.sort(key=lambda row: (row[0], row[4]))
+    return rows if limit is None else rows[:limit]
+
+def merge_page(stored_rows:list, archived_rows:list, offset:int, limit:int):
+    """Rows `offset` to `offset + limit` of both lists, each one ordered by (date, id)."""
+    merged = heapq.merge(stored_rows, archived_rows, key=lambda row: (row[0], row[4]))
+    return list(itertools.islice(merged, offset, offset + limit))
+
+def archived_rollup_rows(session:Session, user_id:uuid.UUID | None = None):
+    """Sentiment counts of the archived uploads, read from their files, as rollup rows."""
+    import pyarrow.parquet as pq
+
+    statement = (
+        select(Uploads.user_id, AiResponseTags.tag, Uploads.archive_path)
+        .join(AiResponseTags, AiResponseTags.upload_id == Uploads.id)
+        .where(Uploads.archived_at != None, Uploads.deleted_at == None)
+    )
+    if user_id is not None:
+        statement = statement.where(Uploads.user_id == user_id)
+    rows = []
+    for upload_user_id, tag, archive_path in session.execute(statement):
+        sentiments = pq.read_table(archive_file(archive_path), columns=["sentiment_prediction"]).column(0).to_pylist()
+        rows.extend(
+            {"user_id": upload_user_id, "tag": tag, "sentiment": sentiment, "count": count}
+            for sentiment, count in Counter(sentiments).items()
+        )
+    return rows
+
+if __name__ == "__main__":
+    # Run periodically, e.g. from cron: python -m api.utils.archive [--older-than-days N]
+    import argparse
+    from api.db import create_all_table_and_db
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    create_all_table_and_db()
+    uploads, rows = archive_old_uploads(args.older_than_days, args.batch_size)
+    print(f"{uploads} uploads archived to {ARCHIVE_DIR}, {rows} rows moved")
@@ -0,0 +1,31 @@
+import os
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+
+from api.utils.metrics import profiled_call
+
+load_dotenv()
+
+# Threads running the blocking work of async routes: bcrypt, spreadsheet parsing, inference and database calls
+BLOCKING_WORKERS = int(os.getenv('BLOCKING_WORKERS', min(32, (os.cpu_count() or 1) + 4)))
+
+_executor = None
+
+def get_blocking_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+    return _executor
+
+def shutdown_blocking_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+async def run_blocking(function, *args, **kwargs):
+    """Awaits `function(*args, **kwargs)` run on the blocking executor, so the event loop keeps serving other requests."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_blocking_executor(), profiled_call(functools.partial(function, *args, **kwargs)))
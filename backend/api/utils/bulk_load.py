@@ -0,0 +1,62 @@
+import io
+
+import pandas as pd
+from sqlalchemy import Table
+
+def bulk_insert_frame(session, table:Table, df:pd.DataFrame):
+    """
+    Inserts every row of `df`, whose columns are named after `table` columns,
+    on the session transaction without building a dict per row.
+
+    Postgres streams the chunk through COPY FROM STDIN, SQLite runs a single
+    executemany over the column values. Other databases go through Core.
+    """
+    if df.empty:
+        return
+    connection = session.connection()
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        _copy_frame(connection, table, df)
+    elif dialect == "sqlite":
+        _executemany_frame(connection, table, df)
+    else:
+        connection.execute(table.insert(), df.to_dict(orient='records'))
+
+# COPY text format: tab separated, \N for NULL and backslash escapes inside values
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+def _copy_column(series:pd.Series):
+    if series.dtype == object:
+        return [r"\N" if value is None or value != value else str(value).translate(_COPY_ESCAPES) for value in series]
+    text = series.astype(str)
+    return text.where(series.notna(), r"\N").tolist()
+
+def _copy_frame(connection, table:Table, df:pd.DataFrame):
+    buffer = io.StringIO()
+    for row in zip(*(_copy_column(df[column]) for column in df.columns)):
+        buffer.write("\t".join(row))
+        buffer.write("\n")
+    buffer.seek(0)
+    columns = ", ".join(f'"{column}"' for column in df.columns)
+    with connection.connection.dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY "{table.name}" ({columns}) FROM STDIN', buffer)
+
+def _column_values(connection, table:Table, series:pd.Series):
+    # Same storage format the ORM writes, e.g. UUIDs as hex and datetimes as text on SQLite
+    processor = table.c[series.name].type.dialect_impl(connection.dialect).bind_processor(connection.dialect)
+    values = series.astype(object).where(series.notna(), None).tolist()
+    if processor is None:
+        return values
+    # Upload-wide columns (date, user, upload) repeat one value, converted once
+    processed = {}
+    return [processed[value] if value in processed else processed.setdefault(value, processor(value)) for value in values]
+
+def _executemany_frame(connection, table:Table, df:pd.DataFrame):
+    columns = ", ".join(f'"{column}"' for column in df.columns)
+    placeholders = ", ".join("?" for _ in df.columns)
+    values = [_column_values(connection, table, df[column]) for column in df.columns]
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.executemany(f'INSERT INTO "{table.name}" ({columns}) VALUES ({placeholders})', zip(*values))
+    finally:
+        cursor.close()
@@ -0,0 +1,147 @@
+import os
+from dotenv import load_dotenv
+import csv
+import io
+import json
+import zlib
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.db import async_engine
+from api.enum.ExportFormat import ExportFormat
+from api.utils.blocking import run_blocking
+
+load_dotenv()
+
+# Rows fetched from the database cursor and written out at a time
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))
+EXPORT_GZIP_LEVEL = int(os.getenv('EXPORT_GZIP_LEVEL', 6))
+
+EXPORT_COLUMNS = ("date", "sentiment", "text", "tag")
+
+MEDIA_TYPES = {
+    ExportFormat.csv: "text/csv",
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.parquet: "application/vnd.apache.parquet",
+}
+
+def export_filename(export_format:ExportFormat, gzip:bool):
+    # Parquet compresses its own pages instead of being wrapped
+    suffix = ".gz" if gzip and export_format != ExportFormat.parquet else ""
+    return f"feedback.{export_format.value}{suffix}"
+
+def export_media_type(export_format:ExportFormat, gzip:bool):
+    if gzip and export_format != ExportFormat.parquet:
+        return "application/gzip"
+    return MEDIA_TYPES[export_format]
+
+async def _batches(statement, params:dict, batch_size:int):
+    # A session of its own: the request one is already closed while the response streams
+    async with AsyncSession(async_engine) as session:
+        result = await session.stream(statement.execution_options(yield_per=batch_size), params)
+        async for rows in result.partitions():
+            yield rows
+
+class _CsvEncoder:
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def encode(self, rows):
+        self.writer.writerows((date.isoformat(), sentiment, text, tag) for date, sentiment, text, tag in rows)
+        data = self.buffer.getvalue().encode()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def finish(self):
+        # Only the header is left when nothing matched
+        return self.encode([])
+
+class _NdjsonEncoder:
+    def encode(self, rows):
+        return "".join(
+            json.dumps({"date": date.isoformat(), "sentiment": sentiment, "text": text, "tag": tag}, ensure_ascii=False) + "\n"
+            for date, sentiment, text, tag in rows
+        ).encode()
+
+    def finish(self):
+        return b""
+
+class _ParquetSink:
+    """Write-only file handing out what was written since the last drain, while keeping the offsets of the whole file."""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+class _ParquetEncoder:
+    def __init__(self, compression:str):
+        # Only needed by this format
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([("date", pa.timestamp("us")), ("sentiment", pa.string()), ("text", pa.string()), ("tag", pa.string())])
+        self.sink = _ParquetSink()
+        self.writer = pq.ParquetWriter(pa.PythonFile(self.sink, mode="w"), self.schema, compression=compression)
+
+    def encode(self, rows):
+        # One row group per batch, sent as soon as it is written
+        columns = list(zip(*rows))
+        self.writer.write_table(self.pa.Table.from_arrays([self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)], schema=self.schema))
+        return self.sink.drain()
+
+    def finish(self):
+        self.writer.close()
+        return self.sink.drain()
+
+class _GzipEncoder:
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, wbits=31) # gzip container
+
+    def encode(self, rows):
+        return self.compressor.compress(self.encoder.encode(rows))
+
+    def finish(self):
+        return self.compressor.compress(self.encoder.finish()) + self.compressor.flush()
+
+def _encoder(export_format:ExportFormat, gzip:bool):
+    if export_format == ExportFormat.parquet:
+        return _ParquetEncoder("gzip" if gzip else "snappy")
+    encoder = _CsvEncoder() if export_format == ExportFormat.csv else _NdjsonEncoder()
+    return _GzipEncoder(encoder) if gzip else encoder
+
+async def export_rows(statement, params:dict, export_format:ExportFormat, gzip:bool = False, batch_size:int = EXPORT_BATCH_SIZE):
+    """
+    Body of an export, in chunks of bytes. Rows are read from a server side
+    cursor `batch_size` at a time, so memory doesn't grow with the result.
+    """
+    encoder = _encoder(export_format, gzip)
+    async for rows in _batches(statement, params, batch_size):
+        # Formatting and compressing a batch takes tens of milliseconds, kept off the event loop
+        data = await run_blocking(encoder.encode, rows)
+        if data:
+            yield data
+    yield await run_blocking(encoder.finish)
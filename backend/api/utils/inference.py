@@ -0,0 +1,121 @@
+import os
+from dotenv import load_dotenv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import time
+
+import numpy as np
+import pandas as pd
+
+from ml_model.preprocess import clear_text_series
+from api.utils.model_registry import LoadedModel, get_active_model, load_version
+from api.utils.metrics import observe_stage
+
+load_dotenv()
+
+# Uploads with fewer rows than this never leave the API process
+INFERENCE_PARALLEL_THRESHOLD = int(os.getenv('INFERENCE_PARALLEL_THRESHOLD', 50000))
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', os.cpu_count() or 1))
+
+_pool = None
+
+# Loaded once per pool worker, and again only when a shard asks for another version
+_worker_model = None
+
+def _init_worker():
+    global _worker_model
+    _worker_model = get_active_model()
+
+def _predict(texts:pd.Series, model:LoadedModel):
+    """Cleaned texts, predictions and the seconds of each stage, returned so pool workers can report them too."""
+    start = time.perf_counter()
+    cleaned = clear_text_series(texts)
+    timings = {"clean": time.perf_counter() - start}
+    start = time.perf_counter()
+    if model.scorer:
+        # The linear table vectorizes and scores in the same pass
+        prediction = model.scorer.predict(cleaned)
+    else:
+        features = model.vectorizer.transform(cleaned)
+        timings["vectorize"] = time.perf_counter() - start
+        start = time.perf_counter()
+        prediction = model.model.predict(features)
+    timings["predict"] = time.perf_counter() - start
+    return cleaned, prediction, timings
+
+def _observe(timings:dict):
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+
+def _predict_shard(texts:pd.Series, version:str):
+    global _worker_model
+    if _worker_model is None or _worker_model.version != version:
+        _worker_model = load_version(version)
+    cleaned, prediction, timings = _predict(texts, _worker_model)
+    return cleaned.tolist(), prediction, timings
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: forking the API process would copy its threads and open connections
+        _pool = ProcessPoolExecutor(
+            max_workers=INFERENCE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+def _to_frame(index, cleaned, prediction):
+    return pd.DataFrame({"Text": cleaned, "Sentiment_Prediction": prediction}, index=index)
+
+def classify_chunk(df:pd.DataFrame, model:LoadedModel):
+    if df.empty:
+        # Every row of the chunk may have been answered by the prediction cache
+        return _to_frame(df.index, [], [])
+    cleaned, prediction, timings = _predict(df['Text'], model)
+    _observe(timings)
+    return _to_frame(df.index, cleaned, prediction)
+
+def _collect(index, futures):
+    cleaned = []
+    prediction = []
+    for future in futures:
+        shard_cleaned, shard_prediction, timings = future.result()
+        _observe(timings)
+        cleaned.extend(shard_cleaned)
+        prediction.append(shard_prediction)
+    return _to_frame(index, cleaned, np.concatenate(prediction))
+
+def classify_chunks(chunks, model:LoadedModel):
+    """
+    Yields every chunk with its cleaned 'Text' and 'Sentiment_Prediction', in order.
+
+    Chunks are classified in-process until the upload reaches
+    INFERENCE_PARALLEL_THRESHOLD rows. From there each chunk is split into one
+    shard per pool worker, with at most two chunks in flight so memory stays
+    bounded by the chunk size.
+    """
+    pending = deque()
+    rows_seen = 0
+    for chunk in chunks:
+        rows_seen += len(chunk)
+        if chunk.empty or rows_seen < INFERENCE_PARALLEL_THRESHOLD or INFERENCE_WORKERS < 2:
+            yield classify_chunk(chunk, model)
+            continue
+
+        pool = get_pool()
+        bounds = np.linspace(0, len(chunk), INFERENCE_WORKERS + 1, dtype=int)
+        shards = [chunk['Text'].iloc[start:end] for start, end in zip(bounds, bounds[1:]) if end > start]
+        pending.append((chunk.index, [pool.submit(_predict_shard, shard, model.version) for shard in shards]))
+        if len(pending) > 1:
+            yield _collect(*pending.popleft())
+
+    while pending:
+        yield _collect(*pending.popleft())
@@ -0,0 +1,184 @@
+import os
+from dotenv import load_dotenv
+from collections import Counter, deque
+from datetime import datetime
+import time
+
+import pandas as pd
+
+from api.db.AIResponse import AiResponse
+from api.db.AIResponseTags import AiResponseTags
+from api.db.Uploads import Uploads
+from api.utils.inference import classify_chunks
+from api.utils.model_registry import LoadedModel
+from api.utils.prediction_cache import prediction_cache
+from api.utils.rollup import add_to_rollup
+from api.utils.bulk_load import bulk_insert_frame
+from api.utils.text_search import index_upload
+from api.utils.xlsx_reader import read_xlsx_column, MissingColumnError
+from api.utils.metrics import observe_stage, timed_stage, UPLOAD_ROWS
+
+load_dotenv()
+
+INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', 10000))
+INGEST_SAMPLE_SIZE = int(os.getenv('INGEST_SAMPLE_SIZE', 100))
+# Retry-After of the writes refused while an upload holds the SQLite database
+LOCKED_RETRY_AFTER = int(os.getenv('LOCKED_RETRY_AFTER', 5))
+
+ACCEPTED_EXTENSIONS = (".csv", ".csv.gz", ".xlsx", ".parquet")
+
+# The only column of an upload that is used, nothing else is parsed
+TEXT_COLUMN = "Text"
+
+def split_extension(filename:str):
+    """(name, extension) of an upload, with .csv.gz as one extension."""
+    name, extension = os.path.splitext(filename)
+    if extension.lower() == ".gz":
+        name, inner = os.path.splitext(name)
+        extension = inner + extension
+    return name, extension.lower()
+
+def read_chunks(file, extension:str, chunk_size:int = INGEST_CHUNK_SIZE):
+    """Yields the Text column of the uploaded spreadsheet as DataFrames of at most `chunk_size` rows."""
+    if extension in (".csv", ".csv.gz"):
+        yield from _read_csv_chunks(file, chunk_size, "gzip" if extension == ".csv.gz" else None)
+    elif extension == ".xlsx":
+        yield from read_xlsx_column(file, TEXT_COLUMN, chunk_size)
+    elif extension == ".parquet":
+        yield from _read_parquet_chunks(file, chunk_size)
+    else:
+        raise ValueError(f"Unsupported extension: {extension}")
+
+def _read_csv_chunks(file, chunk_size:int, compression:str | None):
+    # The other columns are skipped by the tokenizer, and the text is never type-guessed
+    chunks = pd.read_csv(file, usecols=lambda column: column == TEXT_COLUMN, dtype={TEXT_COLUMN: str}, chunksize=chunk_size, compression=compression)
+    for chunk in chunks:
+        if TEXT_COLUMN not in chunk.columns:
+            raise MissingColumnError(f"The file has no '{TEXT_COLUMN}' column")
+        yield chunk
+
+def _read_parquet_chunks(file, chunk_size:int):
+    # Only needed by this format
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(file)
+    if TEXT_COLUMN not in parquet_file.schema_arrow.names:
+        raise MissingColumnError(f"The file has no '{TEXT_COLUMN}' column")
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=[TEXT_COLUMN]):
+        yield batch.to_pandas()
+
+def is_duplicated_tag_error(error:Exception):
+    return "UNIQUE constraint failed: airesponsetags.key" in str(error) or "airesponsetags_pkey" in str(error)
+
+def is_database_locked_error(error:Exception):
+    # SQLite has a single writer, held by a running upload until it commits
+    return "database is locked" in str(error)
+
+def _timed(iterator, timings:dict, stage:str, observe:bool = False):
+    iterator = iter(iterator)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            elapsed = time.perf_counter() - start
+            timings[stage] += elapsed
+        if observe:
+            observe_stage(stage, elapsed)
+        yield item
+
+def _cache_misses(session, chunks, model:LoadedModel, looked_up:deque):
+    # Only the rows the cache can't answer go to the model, the lookups wait on `looked_up` for the merge
+    for chunk in chunks:
+        with timed_stage("cache_lookup"):
+            lookup = prediction_cache.lookup(session, chunk['Text'].tolist(), model.version)
+        looked_up.append((chunk, lookup))
+        yield chunk.iloc[lookup.miss_positions]
+
+def _classify_cached(session, chunks, model:LoadedModel):
+    looked_up = deque()
+    for classified in classify_chunks(_cache_misses(session, chunks, model, looked_up), model):
+        chunk, lookup = looked_up.popleft()
+        cleaned, prediction, new_entries = lookup.merge(classified)
+        with timed_stage("cache_store"):
+            prediction_cache.store(session, new_entries, model.version)
+        yield pd.DataFrame({"Text": cleaned, "Sentiment_Prediction": prediction}, index=chunk.index)
+
+def ingest_file(session, file, extension:str, tag:str, user_id, model:LoadedModel, sample_size:int | None = None, chunk_size:int = INGEST_CHUNK_SIZE, progress=None):
+    """
+    Classifies and stores an upload chunk by chunk inside the session transaction.
+
+    Nothing is committed here: the caller commits once every chunk, the upload,
+    its AiResponseTags row and the sentiment rollup are written, so a failed
+    upload leaves no rows behind. Only the persistent prediction cache is
+    committed apart on Postgres, chunk by chunk.
+    `sample_size=None` keeps every classified row in the returned sample.
+    `progress(rows, stage_timings)` is called after every stored chunk; raising
+    from it stops the upload.
+    """
+    today = datetime.now()
+    related_key = f"{str(user_id)}{str(today)}"
+
+    upload = Uploads(user_id=user_id, consulted_query_date=today, model_version=model.version)
+    session.add(upload)
+    session.flush()
+
+    dict_tag_prediction = {
+        "consulted_query_date" : today,
+        "tag" : tag,
+        "user_id" : user_id,
+        "related_key" : related_key,
+        "key" : f"{str(user_id)}{str(tag)}",
+        "upload_id" : upload.id,
+    }
+    tag_to_db = AiResponseTags.model_validate(dict_tag_prediction)
+    session.add(tag_to_db)
+    # Fails fast on an already analyzed tag before any row is classified
+    session.flush()
+
+    sample = []
+    rows = 0
+    sentiment_counts = Counter()
+    # "classify" is measured around the parsing generator, the parse time is taken out of it on report
+    timings = {"parse": 0.0, "classify": 0.0, "insert": 0.0}
+    chunks = _timed(read_chunks(file, extension, chunk_size), timings, "parse", observe=True)
+    classified = _classify_cached(session, chunks, model) if prediction_cache.enabled else classify_chunks(chunks, model)
+    for df in _timed(classified, timings, "classify"):
+        insert_start = time.perf_counter()
+        rows += len(df)
+
+        if sample_size is None:
+            sample.extend(df.to_dict(orient='records'))
+        elif len(sample) < sample_size:
+            sample.extend(df.head(sample_size - len(sample)).to_dict(orient='records'))
+
+        df.rename({"Text":"text", "Sentiment_Prediction":"sentiment_prediction"}, axis=1, inplace=True)
+        df["consulted_query_date"] = today
+        df["user_id"] = user_id
+        df["related_key"] = related_key
+        df["model_version"] = model.version
+        df["upload_id"] = upload.id
+        bulk_insert_frame(session, AiResponse.__table__, df)
+        sentiment_counts.update(df["sentiment_prediction"].astype(str).value_counts().to_dict())
+        insert_time = time.perf_counter() - insert_start
+        timings["insert"] += insert_time
+        observe_stage("insert", insert_time)
+
+        if progress:
+            progress(rows, _stage_timings(timings))
+
+    with timed_stage("index"):
+        index_upload(session, upload.id)
+    with timed_stage("rollup"):
+        add_to_rollup(session, user_id, tag, sentiment_counts)
+    UPLOAD_ROWS.inc(rows)
+    return tag_to_db, rows, sample
+
+def _stage_timings(timings:dict):
+    return {
+        "parse": round(timings["parse"], 4),
+        "classify": round(timings["classify"] - timings["parse"], 4),
+        "insert": round(timings["insert"], 4),
+    }
@@ -0,0 +1,341 @@
+import os
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+from sqlmodel import Session, select, update
+from sqlalchemy.exc import OperationalError
+
+from api.db import engine
+from api.db.Jobs import Jobs
+from api.db.Uploads import Uploads
+from api.enum.JobStatus import JobStatus
+from api.enum.JobKind import JobKind
+from api.utils.model_registry import get_active_model
+from api.utils.ingest import ingest_file, is_duplicated_tag_error, is_database_locked_error, split_extension
+from api.utils.purge import purge_batch
+from api.utils.archive import remove_archive
+from api.utils.metrics import timed_stage
+
+load_dotenv()
+
+UPLOAD_JOBS_DIR = os.getenv('UPLOAD_JOBS_DIR', 'uploads')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+# A running job claimed on another host whose heartbeat is older than this is taken as abandoned
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', 300))
+# Wait before retrying a purge batch that found the SQLite database locked by an upload
+PURGE_RETRY_SECONDS = float(os.getenv('PURGE_RETRY_SECONDS', 1))
+
+FINISHED_STATUS = (JobStatus.done.value, JobStatus.failed.value, JobStatus.cancelled.value)
+
+class JobCancelled(Exception):
+    pass
+
+class JobInterrupted(Exception):
+    pass
+
+_executor = None
+_stopping = threading.Event()
+# Progress of the jobs running on this process, always up to date even when it can't be written to the database
+_live_progress = {}
+_cancel_requested = set()
+# Jobs of this process past their last chunk, a cancel can't stop them anymore
+_finishing = set()
+_cancel_lock = threading.Lock()
+
+def _can_write_while_ingesting():
+    # SQLite has a single writer: the upload transaction locks the other connections out until it commits
+    return engine.dialect.name != "sqlite"
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="upload-job")
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    _stopping.set()
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+def enqueue_upload(session:Session, file, filename:str, user_id:uuid.UUID):
+    tag, extension = split_extension(filename)
+    job = Jobs(user_id=user_id, tag=tag)
+    os.makedirs(UPLOAD_JOBS_DIR, exist_ok=True)
+    job.file_path = os.path.join(UPLOAD_JOBS_DIR, f"{job.id}{extension}")
+
+    # The job only exists once its file is complete, so no worker (resume_jobs included) reads a partial upload
+    temporary_path = f"{job.file_path}.tmp"
+    try:
+        with open(temporary_path, 'wb') as spooled_file:
+            shutil.copyfileobj(file, spooled_file)
+        os.replace(temporary_path, job.file_path)
+        session.add(job)
+        session.commit()
+    except Exception:
+        session.rollback()
+        _remove_file(temporary_path)
+        _remove_file(job.file_path)
+        raise
+    session.refresh(job)
+    get_executor().submit(run_upload_job, job.id)
+    return job
+
+def submit_job(job_id:uuid.UUID, kind:str):
+    runner = run_purge_job if kind == JobKind.purge.value else run_upload_job
+    get_executor().submit(runner, job_id)
+
+def _process_start(pid:int):
+    # Start time of a process on Linux, tells a reused pid apart from the process that claimed a job
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            return file.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+def worker_id():
+    # Not kept at import: gunicorn forks the workers from the master that imported the app
+    pid = os.getpid()
+    return f"{socket.gethostname()}:{pid}:{_process_start(pid) or ''}"
+
+def _worker_is_alive(worker:str):
+    """Whether the process that claimed a job still runs, None when it ran on another host."""
+    host, pid, started = worker.rsplit(":", 2)
+    if host != socket.gethostname():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Alive, under another user
+        pass
+    return not started or _process_start(int(pid)) == started
+
+def _is_abandoned(worker:str | None, heartbeat_at:datetime | None, stale_before:datetime):
+    alive = _worker_is_alive(worker) if worker else None
+    if alive is not None:
+        return not alive
+    # Claimed on another host, only its heartbeat tells, and SQLite can't write one during an upload
+    if _can_write_while_ingesting():
+        return heartbeat_at is None or heartbeat_at < stale_before
+    return worker is None
+
+def resume_jobs():
+    """
+    Requeues the running jobs whose worker is gone, and submits the queued
+    ones. Called on startup by every API worker, so the jobs its siblings
+    are running are left alone.
+    """
+    stale_before = datetime.now() - timedelta(seconds=JOB_STALE_SECONDS)
+    with Session(engine) as session:
+        running = session.exec(select(Jobs.id, Jobs.worker, Jobs.heartbeat_at).where(Jobs.status == JobStatus.running.value)).all()
+        for job_id, worker, heartbeat_at in running:
+            if _is_abandoned(worker, heartbeat_at, stale_before):
+                # Unless another starting worker requeued and claimed it first
+                session.execute(
+                    update(Jobs)
+                    .where(Jobs.id == job_id, Jobs.status == JobStatus.running.value, Jobs.worker == worker)
+                    .values(status=JobStatus.queued.value)
+                )
+        session.commit()
+        queued = session.exec(select(Jobs.id, Jobs.kind).where(Jobs.status == JobStatus.queued.value).order_by(Jobs.created_at)).all()
+    for job_id, kind in queued:
+        submit_job(job_id, kind)
+
+def get_job_progress(job:Jobs):
+    live = _live_progress.get(job.id)
+    if live and job.status == JobStatus.running.value:
+        job.rows_processed = live["rows_processed"]
+        job.stage_timings = live["stage_timings"]
+    return job
+
+def cancel_job(session:Session, job:Jobs):
+    """
+    Stops a queued job right away and a running one at its next chunk.
+    Returns False when the job is already finishing and will be stored anyway.
+    """
+    with _cancel_lock:
+        if job.id in _finishing:
+            return False
+        _cancel_requested.add(job.id)
+    if not _can_write_while_ingesting() and _live_progress:
+        # An upload holds the SQLite lock, this single process is the one that will see the flag
+        return True
+    try:
+        cancelled = session.execute(
+            update(Jobs)
+            .where(Jobs.id == job.id, Jobs.status == JobStatus.queued.value)
+            .values(status=JobStatus.cancelled.value, finished_at=datetime.now())
+        )
+        requested = cancelled
+        if not cancelled.rowcount:
+            # Only while running: run_upload_job marks the job done in its upload transaction, checking this flag
+            requested = session.execute(
+                update(Jobs)
+                .where(Jobs.id == job.id, Jobs.status == JobStatus.running.value)
+                .values(cancel_requested=True)
+            )
+        session.commit()
+    except OperationalError:
+        session.rollback()
+        _cancel_requested.discard(job.id)
+        raise
+    if cancelled.rowcount:
+        _cancel_requested.discard(job.id)
+        _remove_file(job.file_path)
+    if not requested.rowcount:
+        _cancel_requested.discard(job.id)
+        return False
+    return True
+
+def _claim(job_id:uuid.UUID):
+    with Session(engine) as session:
+        claimed = session.execute(
+            update(Jobs)
+            .where(Jobs.id == job_id, Jobs.status == JobStatus.queued.value)
+            .values(status=JobStatus.running.value, started_at=datetime.now(), heartbeat_at=datetime.now(), worker=worker_id(), rows_processed=0, stage_timings={})
+        )
+        session.commit()
+        return claimed.rowcount == 1
+
+def _finish(job_id:uuid.UUID, status:JobStatus, **values):
+    with Session(engine) as session:
+        if status != JobStatus.queued:
+            values["finished_at"] = datetime.now()
+        session.execute(update(Jobs).where(Jobs.id == job_id).values(status=status.value, **values))
+        session.commit()
+
+def _remove_file(path:str | None):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def _report_progress(job_id:uuid.UUID, rows:int, stage_timings:dict):
+    _live_progress[job_id] = {"rows_processed": rows, "stage_timings": stage_timings}
+    if _stopping.is_set():
+        raise JobInterrupted()
+    if job_id in _cancel_requested:
+        raise JobCancelled()
+
+    if not _can_write_while_ingesting():
+        return
+    with Session(engine) as session:
+        session.execute(
+            update(Jobs).where(Jobs.id == job_id)
+            .values(rows_processed=rows, stage_timings=stage_timings, heartbeat_at=datetime.now())
+        )
+        session.commit()
+        # Cancellation may come from another API worker
+        if session.exec(select(Jobs.cancel_requested).where(Jobs.id == job_id)).one():
+            raise JobCancelled()
+
+def run_upload_job(job_id:uuid.UUID):
+    if _stopping.is_set() or not _claim(job_id):
+        return
+
+    with Session(engine) as session:
+        job = session.get(Jobs, job_id)
+        file_path, tag, user_id = job.file_path, job.tag, job.user_id
+        extension = split_extension(file_path)[1]
+        status, values = JobStatus.done, {}
+        try:
+            if job_id in _cancel_requested:
+                raise JobCancelled()
+            model = get_active_model()
+            with open(file_path, 'rb') as file:
+                _, rows, _ = ingest_file(
+                    session, file, extension, tag, user_id, model,
+                    sample_size=0, progress=lambda rows, timings: _report_progress(job_id, rows, timings),
+                )
+            with _cancel_lock:
+                if job_id in _cancel_requested:
+                    raise JobCancelled()
+                _finishing.add(job_id)
+            # On the upload transaction: a cancel from another worker either came first and stops it, or finds it done
+            finished = session.execute(
+                update(Jobs)
+                .where(Jobs.id == job_id, Jobs.cancel_requested == False)
+                .values(status=JobStatus.done.value, finished_at=datetime.now(), rows_processed=rows)
+            )
+            if not finished.rowcount:
+                raise JobCancelled()
+            with timed_stage("commit"):
+                session.commit()
+            values["rows_processed"] = rows
+        except JobCancelled:
+            session.rollback()
+            status = JobStatus.cancelled
+        except JobInterrupted:
+            # Picked up again by resume_jobs on the next start
+            session.rollback()
+            status = JobStatus.queued
+        except Exception as e:
+            session.rollback()
+            status = JobStatus.failed
+            values["error"] = "Tag/Document name already analyzed. Please choose another or rename it" if is_duplicated_tag_error(e) else str(e)
+
+    live = _live_progress.pop(job_id, None)
+    with _cancel_lock:
+        _cancel_requested.discard(job_id)
+        _finishing.discard(job_id)
+    if live and status != JobStatus.queued:
+        values.setdefault("rows_processed", live["rows_processed"])
+        values["stage_timings"] = live["stage_timings"]
+    _finish(job_id, status, **values)
+    if status != JobStatus.queued:
+        _remove_file(file_path)
+
+def run_purge_job(job_id:uuid.UUID):
+    """Deletes the rows of a deleted tag in batches, each one committed with the job progress."""
+    if _stopping.is_set() or not _claim(job_id):
+        return
+
+    with Session(engine) as session:
+        upload_id = session.get(Jobs, job_id).upload_id
+        archive_path = session.exec(select(Uploads.archive_path).where(Uploads.id == upload_id)).first()
+        session.commit()
+        rows, status, values = 0, JobStatus.done, {}
+        started = time.perf_counter()
+        try:
+            while True:
+                if _stopping.is_set():
+                    raise JobInterrupted()
+                try:
+                    deleted = purge_batch(session, upload_id)
+                    session.execute(
+                        update(Jobs).where(Jobs.id == job_id)
+                        .values(rows_processed=rows + deleted, stage_timings={"delete": time.perf_counter() - started}, heartbeat_at=datetime.now())
+                    )
+                    session.commit()
+                except OperationalError as e:
+                    session.rollback()
+                    if not is_database_locked_error(e):
+                        raise
+                    # Another transaction holds the SQLite lock, the batch is tried again once it is released
+                    time.sleep(PURGE_RETRY_SECONDS)
+                    continue
+                if not deleted:
+                    break
+                rows += deleted
+        except JobInterrupted:
+            # Picked up again by resume_jobs, the rows already deleted stay deleted
+            session.rollback()
+            status = JobStatus.queued
+        except Exception as e:
+            session.rollback()
+            status = JobStatus.failed
+            values["error"] = str(e)
+
+    if status == JobStatus.done:
+        # The upload is gone, and its archive with it
+        remove_archive(archive_path)
+    values["rows_processed"] = rows
+    values["stage_timings"] = {"delete": time.perf_counter() - started}
+    _finish(job_id, status, **values)
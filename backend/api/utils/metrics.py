@@ -0,0 +1,175 @@
+import os
+from dotenv import load_dotenv
+import cProfile
+from contextlib import contextmanager
+import contextvars
+from datetime import datetime
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+
+load_dotenv()
+
+# Fraction of requests run under cProfile, 0 turns profiling off
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+# Profiled requests that took longer than this are written to PROFILE_DIR
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', 1000))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to answer a request, streamed bodies included",
+    ["method", "route", "status"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Time of a database statement on the cursor",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+STAGE_LATENCY = Histogram(
+    "upload_stage_duration_seconds", "Time of an upload stage, per chunk (or per pool shard) for the row stages and per upload for the others",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+UPLOAD_ROWS = Counter("upload_rows", "Rows classified and stored by uploads")
+
+# Label of every statement kind outside of these is "other", so the label stays bounded
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+_profile_lock = threading.Lock()
+# Before 3.12 cProfile only sees the thread that enabled it. From 3.12 it is built on sys.monitoring:
+# the request's profiler already sees every thread, and a second one can't be enabled
+_PROFILER_PER_THREAD = sys.version_info < (3, 12)
+# Profiles taken on run_blocking threads for the request being profiled, merged into its dump
+_thread_profiles = contextvars.ContextVar("thread_profiles", default=None)
+
+def observe_stage(stage:str, seconds:float):
+    STAGE_LATENCY.labels(stage).observe(seconds)
+
+@contextmanager
+def timed_stage(stage:str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+def _operation(statement:str):
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation.lower() if operation in _OPERATIONS else "other"
+
+def instrument_engine(engine):
+    """Times every statement sent through `engine` (the sync_engine of an async one)."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(connection, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(connection, cursor, statement, parameters, context, executemany):
+        DB_QUERY_LATENCY.labels(_operation(statement)).observe(time.perf_counter() - context._query_start)
+
+def render_metrics():
+    # Every gunicorn worker keeps its own values, merged from PROMETHEUS_MULTIPROC_DIR when it is set
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+def profiled_call(function):
+    """
+    `function` run under a profiler of its own when the current request is
+    profiled, so what it does on another thread ends up on the request dump.
+    """
+    profiles = _thread_profiles.get()
+    if profiles is None or not _PROFILER_PER_THREAD:
+        return function
+
+    def run():
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is active, the call runs unprofiled
+            return function()
+        try:
+            return function()
+        finally:
+            profiler.disable()
+            profiles.append(profiler)
+    return run
+
+def _start_profile():
+    # One profiled request at a time, a second profiler would replace the first one
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE or not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (a debugger, coverage) is active
+        _profile_lock.release()
+        return None
+    return profiler, _thread_profiles.set([])
+
+def _finish_profile(profile:tuple, method:str, route:str, elapsed:float):
+    profiler, token = profile
+    try:
+        profiler.disable()
+        thread_profiles = _thread_profiles.get()
+        _thread_profiles.reset(token)
+        if elapsed * 1000 >= PROFILE_SLOW_MS:
+            stats = pstats.Stats(profiler)
+            for thread_profile in thread_profiles:
+                stats.add(thread_profile)
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            name = re.sub(r"[^\w-]+", "_", route).strip("_")
+            stats.dump_stats(os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%dT%H%M%S%f}-{method}-{name}.prof"))
+    finally:
+        _profile_lock.release()
+
+class MetricsMiddleware:
+    """
+    Observes the latency of every HTTP request on REQUEST_LATENCY, labelled by
+    route template instead of path so ids don't make new series.
+
+    PROFILE_SAMPLE_RATE of the requests run under cProfile, and the ones slower
+    than PROFILE_SLOW_MS are dumped to PROFILE_DIR (open them with pstats or
+    snakeviz). The profile covers the event loop thread, coroutines of other
+    requests running meanwhile included, and the request's run_blocking
+    calls; the inference pool processes aren't in it.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profile = _start_profile()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            # The router leaves the matched route on the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(elapsed)
+            if profile:
+                _finish_profile(profile, scope["method"], route, elapsed)
@@ -0,0 +1,47 @@
+from sqlmodel import Session, select
+from sqlalchemy import inspect, text, update
+
+from api.db import engine
+from api.db.AIResponse import AiResponse
+from api.db.AIResponseTags import AiResponseTags
+from api.db.Uploads import Uploads
+
+def migrate_upload_ids(session:Session):
+    """
+    Creates the upload of every tag stored before uploads existed and points
+    its rows to it. Each tag is committed on its own, so the migration can be
+    stopped and run again. Returns the number of tags migrated.
+    """
+    pending = session.exec(select(AiResponseTags).where(AiResponseTags.upload_id == None)).all()
+    for tag in pending:
+        upload = Uploads(user_id=tag.user_id, consulted_query_date=tag.consulted_query_date)
+        session.add(upload)
+        session.flush()
+        tag.upload_id = upload.id
+        # Rows were matched to their tag through related_key, or through the upload date on older data
+        if tag.related_key:
+            rows = AiResponse.related_key == tag.related_key
+        else:
+            rows = (AiResponse.user_id == tag.user_id) & (AiResponse.consulted_query_date == tag.consulted_query_date)
+        session.execute(update(AiResponse).where(rows, AiResponse.upload_id == None).values(upload_id=upload.id))
+        session.commit()
+    return len(pending)
+
+def add_foreign_keys():
+    # Columns added by add_missing_columns carry no constraint; SQLite can't add one to an existing table
+    if engine.dialect.name == "sqlite":
+        return
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in (AiResponse.__tablename__, AiResponseTags.__tablename__):
+            if not any(foreign_key["constrained_columns"] == ["upload_id"] for foreign_key in inspector.get_foreign_keys(table)):
+                connection.execute(text(f"ALTER TABLE {table} ADD FOREIGN KEY (upload_id) REFERENCES {Uploads.__tablename__} (id)"))
+
+if __name__ == "__main__":
+    # Run once after upgrading, then rebuild the rollup: python -m api.utils.migrate_uploads && python -m api.utils.rollup
+    from api.db import create_all_table_and_db
+    create_all_table_and_db()
+    with Session(engine) as session:
+        migrated = migrate_upload_ids(session)
+    add_foreign_keys()
+    print(f"{migrated} uploads migrated")
@@ -0,0 +1,92 @@
+import os
+from dotenv import load_dotenv
+from typing import NamedTuple
+import threading
+
+import joblib
+
+from ml_model.linear_table import LinearTableScorer, LINEAR_TABLE_FILE
+
+load_dotenv()
+
+# Every version lives in its own folder, CURRENT holds the name of the one being served
+MODELS_DIR = os.getenv('MODELS_DIR', 'ml_model/model')
+MODEL_FILE = 'modelo_sentimento.pkl'
+VECTORIZER_FILE = 'vectorizer.pkl'
+CURRENT_FILE = 'CURRENT'
+
+class LoadedModel(NamedTuple):
+    version: str
+    # Only loaded for versions without a linear table
+    model: object | None
+    vectorizer: object | None
+    # Set when the version folder has an exported linear table
+    scorer: LinearTableScorer | None = None
+
+class ModelVersionNotFound(Exception):
+    pass
+
+_active = None
+_active_stamp = None
+_lock = threading.Lock()
+
+def list_versions():
+    if not os.path.isdir(MODELS_DIR):
+        return []
+    return sorted(
+        version for version in os.listdir(MODELS_DIR)
+        if os.path.isfile(os.path.join(MODELS_DIR, version, MODEL_FILE))
+        and os.path.isfile(os.path.join(MODELS_DIR, version, VECTORIZER_FILE))
+    )
+
+def load_version(version:str):
+    if version not in list_versions():
+        raise ModelVersionNotFound(f"Model version '{version}' not found on {MODELS_DIR}")
+    table_path = os.path.join(MODELS_DIR, version, LINEAR_TABLE_FILE)
+    if os.path.isdir(table_path):
+        # Memory mapped arrays, shared read-only by every process serving this version
+        return LoadedModel(version=version, model=None, vectorizer=None, scorer=LinearTableScorer(table_path))
+    # Without a table only the model's numpy arrays are mapped, its vocabulary is a copy of each process
+    return LoadedModel(
+        version=version,
+        model=joblib.load(os.path.join(MODELS_DIR, version, MODEL_FILE), mmap_mode='r'),
+        vectorizer=joblib.load(os.path.join(MODELS_DIR, version, VECTORIZER_FILE), mmap_mode='r'),
+    )
+
+def _current_path():
+    return os.path.join(MODELS_DIR, CURRENT_FILE)
+
+def _read_current():
+    with open(_current_path()) as current:
+        return current.read().strip()
+
+def get_active_model():
+    """
+    Returns the version named on CURRENT, reloading it when the file changed.
+
+    The check is a single stat, so a version activated by another API worker is
+    picked up on the next upload without a restart.
+    """
+    global _active, _active_stamp
+    stamp = os.stat(_current_path()).st_mtime_ns
+    if _active is None or stamp != _active_stamp:
+        with _lock:
+            if _active is None or stamp != _active_stamp:
+                version = _read_current()
+                if _active is None or _active.version != version:
+                    _active = load_version(version)
+                _active_stamp = stamp
+    return _active
+
+def activate_version(version:str):
+    """Loads `version` and then atomically points CURRENT to it."""
+    global _active, _active_stamp
+    loaded = load_version(version)
+    with _lock:
+        temporary_path = f"{_current_path()}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as current:
+            current.write(f"{version}\n")
+        os.replace(temporary_path, _current_path())
+        _active = loaded
+        _active_stamp = os.stat(_current_path()).st_mtime_ns
+    return loaded
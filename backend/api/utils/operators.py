@@ -1,7 +1,15 @@
-def convert_text_to_operator(text:str):
-    match text :
-        case "gte": return ">="
-        case "gt": return ">"
-        case "e": return "="
-        case "lt": return "<"
-        case "lte": return "<="
+import operator
+
+from api.enum.DateOperator import DateOperator
+
+DATE_OPERATORS = {
+    DateOperator.gte: operator.ge,
+    DateOperator.gt: operator.gt,
+    DateOperator.e: operator.eq,
+    DateOperator.lt: operator.lt,
+    DateOperator.lte: operator.le,
+}
+
+def convert_date_operator(date_operator:DateOperator):
+    """Comparison applied to the column, e.g. convert_date_operator(DateOperator.gte)(column, value)."""
+    return DATE_OPERATORS[date_operator]
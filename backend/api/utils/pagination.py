@@ -0,0 +1,20 @@
+import base64
+import binascii
+from datetime import datetime
+import json
+
+class InvalidCursor(Exception):
+    pass
+
+def encode_cursor(consulted_query_date, id:int):
+    """Opaque cursor pointing right after the (consulted_query_date, id) row."""
+    # SQLite hands the date back as text, other databases as datetime; both print the same way
+    payload = json.dumps({"date": str(consulted_query_date), "id": id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor:str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(payload["date"]), int(payload["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,182 @@
+import os
+from dotenv import load_dotenv
+from datetime import datetime
+import re
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, text
+from sqlalchemy.exc import DBAPIError
+
+from api.db.AIResponse import AiResponse
+from api.db.Uploads import Uploads
+
+load_dotenv()
+
+# Monthly partitions created ahead of the current one, on startup and on every archive run
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+# Hash partitions by user_id inside every month, 0 keeps one table per month
+AIRESPONSE_USER_PARTITIONS = int(os.getenv('AIRESPONSE_USER_PARTITIONS', 0))
+
+TABLE = AiResponse.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_NAME = re.compile(rf"{TABLE}_y(\d{{4}})m(\d{{2}})")
+
+def month_start(date:datetime):
+    return datetime(date.year, date.month, 1)
+
+def add_months(month:datetime, months:int):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(month:datetime):
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+def partitioned_table():
+    """
+    airesponse as created on Postgres: the model's columns and indexes, range
+    partitioned by consulted_query_date. Postgres wants the partition key in
+    the primary key, the ORM keeps using id alone.
+    """
+    metadata = MetaData()
+    # Target of the upload_id foreign key
+    Uploads.__table__.to_metadata(metadata)
+    table = AiResponse.__table__.to_metadata(metadata)
+    table.c.consulted_query_date.primary_key = True
+    table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.consulted_query_date))
+    table.c.id.autoincrement = True
+    table.dialect_options["postgresql"]["partition_by"] = "RANGE (consulted_query_date)"
+    return table
+
+def table_kind(connection, name:str = TABLE):
+    """'p' for a partitioned table, 'r' for a plain one, None when it doesn't exist."""
+    return connection.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+
+def create_partitioned_table(connection):
+    """Creates airesponse partitioned, with its default and current partitions and its text search index, unless it exists."""
+    if table_kind(connection) is not None:
+        return False
+    # Imported here, it depends on the models of this package
+    from api.utils.text_search import create_text_search_index
+
+    partitioned_table().create(connection)
+    # Rows outside of every month partition land here instead of failing the upload
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+    ensure_partitions(connection)
+    # Still empty, nothing to fill
+    create_text_search_index(connection)
+    return True
+
+def create_month_partition(connection, month:datetime):
+    """
+    Creates the partition of `month` (and its user hash partitions). Months
+    that already got rows on the default partition are left there: Postgres
+    refuses a partition whose rows sit on the default one.
+    """
+    name = partition_name(month)
+    if table_kind(connection, name) is not None:
+        return False
+    start, end = month, add_months(month, 1)
+    if connection.execute(
+        text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE consulted_query_date >= :start AND consulted_query_date < :end LIMIT 1"),
+        {"start": start, "end": end},
+    ).first():
+        print(f"Rows of {month:%Y-%m} are on {DEFAULT_PARTITION}, its partition is not created")
+        return False
+
+    bounds = f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    if AIRESPONSE_USER_PARTITIONS > 0:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF {TABLE} {bounds} PARTITION BY HASH (user_id)"))
+        for remainder in range(AIRESPONSE_USER_PARTITIONS):
+            connection.execute(text(
+                f"CREATE TABLE {name}_u{remainder} PARTITION OF {name} "
+                f"FOR VALUES WITH (MODULUS {AIRESPONSE_USER_PARTITIONS}, REMAINDER {remainder})"
+            ))
+    else:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF {TABLE} {bounds}"))
+    return True
+
+def ensure_partitions(connection, first:datetime | None = None, months_ahead:int = PARTITION_MONTHS_AHEAD):
+    """Creates the missing partitions from `first` (this month by default) to `months_ahead` months from now."""
+    month = month_start(first or datetime.now())
+    last = add_months(month_start(datetime.now()), months_ahead)
+    created = []
+    while month <= last:
+        if create_month_partition(connection, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+def month_partitions(connection):
+    """{month: partition name} of the month partitions of airesponse."""
+    names = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:name)"
+    ), {"name": TABLE}).scalars()
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.fullmatch(name)
+        if match:
+            partitions[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+def drop_empty_partitions(connection, before:datetime):
+    """
+    Drops the month partitions that end before `before` and have no rows
+    left, once the archive job moved them out. Dropping locks airesponse,
+    a partition that can't get the lock within a few seconds is kept.
+    """
+    dropped = []
+    for month, name in sorted(month_partitions(connection).items()):
+        if add_months(month, 1) > before:
+            continue
+        if connection.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first():
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(text("SET LOCAL lock_timeout = '5s'"))
+                connection.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+        except DBAPIError as e:
+            print(f"{name} not dropped: {e}")
+    return dropped
+
+def migrate_to_partitioned(connection):
+    """
+    Moves an existing plain airesponse into a partitioned one, on the caller
+    transaction: it holds airesponse locked until the copy is committed.
+    Returns the rows copied, None when airesponse is already partitioned.
+    """
+    if table_kind(connection) != "r":
+        return None
+    # Imported here, it depends on the models of this package
+    from api.utils.text_search import create_text_search_index
+
+    legacy = f"{TABLE}_unpartitioned"
+    connection.execute(text(f"ALTER TABLE {TABLE} RENAME TO {legacy}"))
+    # Index and constraint names are per schema, the new table takes them over
+    for (index,) in connection.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :name"), {"name": legacy}):
+        connection.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_unpartitioned"'))
+
+    partitioned_table().create(connection)
+    connection.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+    oldest = connection.execute(text(f"SELECT min(consulted_query_date) FROM {legacy}")).scalar()
+    ensure_partitions(connection, first=oldest)
+    # Before the copy, so the generated search column is computed once per row
+    create_text_search_index(connection)
+
+    columns = ", ".join(f'"{column.name}"' for column in AiResponse.__table__.columns)
+    copied = connection.execute(text(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {legacy}")).rowcount
+    connection.execute(text(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce((SELECT max(id) FROM {TABLE}), 1))"))
+    connection.execute(text(f"DROP TABLE {legacy}"))
+    return copied
+
+if __name__ == "__main__":
+    # Run once to partition an existing database, during a maintenance window: python -m api.utils.partitions
+    from api.db import engine, create_all_table_and_db
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("Partitioning is only available on Postgres")
+    with engine.begin() as connection:
+        copied = migrate_to_partitioned(connection)
+    create_all_table_and_db()
+    print("airesponse was already partitioned" if copied is None else f"{copied} rows moved to the partitioned airesponse")
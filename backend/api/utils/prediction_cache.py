@@ -0,0 +1,178 @@
+import os
+from dotenv import load_dotenv
+from collections import OrderedDict
+import hashlib
+import threading
+
+from sqlmodel import Session, select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from api.db.PredictionCache import PredictionCache
+
+load_dotenv()
+
+# Entries kept in memory by each API process, 0 turns the cache off
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 100000))
+# Also keeps every prediction on the predictioncache table, shared by every worker and kept across restarts
+PREDICTION_CACHE_PERSIST = os.getenv('PREDICTION_CACHE_PERSIST', 'false').lower() == 'true'
+
+# SQLite can't bind more parameters than this on a single statement
+_PERSISTENT_BATCH_SIZE = 500
+
+def text_key(text):
+    if not isinstance(text, str):
+        return None
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+class CacheLookup:
+    """Result of a chunk lookup: what was cached, and the rows that still need the model."""
+    def __init__(self, keys, found):
+        self.keys = keys
+        self.found = found
+        self.miss_positions = []
+        seen = set()
+        for position, key in enumerate(keys):
+            if key is None:
+                self.miss_positions.append(position)
+            elif key not in found and key not in seen:
+                # Repeated texts of the chunk are classified once
+                seen.add(key)
+                self.miss_positions.append(position)
+
+    def merge(self, classified):
+        """Returns (cleaned, prediction) lists for the whole chunk, `classified` being the miss rows in order."""
+        new_entries = {}
+        by_position = {}
+        for position, cleaned, prediction in zip(self.miss_positions, classified['Text'], classified['Sentiment_Prediction']):
+            by_position[position] = (cleaned, prediction)
+            if self.keys[position] is not None:
+                new_entries[self.keys[position]] = (cleaned, prediction)
+
+        cleaned = []
+        prediction = []
+        for position, key in enumerate(self.keys):
+            entry = by_position.get(position) or self.found.get(key) or new_entries[key]
+            cleaned.append(entry[0])
+            prediction.append(entry[1])
+        return cleaned, prediction, new_entries
+
+class LRUPredictionCache:
+    """
+    Cleaned text and prediction of texts already classified, keyed by model
+    version and a hash of the raw text, so repeated feedback skips clear_text
+    and the model.
+    """
+    def __init__(self, max_size:int, persist:bool):
+        self.max_size = max_size
+        self.persist = persist
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 or self.persist
+
+    def lookup(self, session, texts, version:str):
+        keys = [text_key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key is None or key in found:
+                    continue
+                entry = self._entries.get((version, key))
+                if entry is not None:
+                    self._entries.move_to_end((version, key))
+                    found[key] = entry
+
+        missing = {key for key in keys if key is not None and key not in found}
+        persistent = {}
+        if self.persist and missing:
+            persistent = self._load_persistent(session, missing, version)
+            found.update(persistent)
+            self._remember(persistent, version)
+
+        with self._lock:
+            for key in keys:
+                if key in persistent:
+                    self.persistent_hits += 1
+                elif key in found:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return CacheLookup(keys, found)
+
+    def store(self, session, entries:dict, version:str):
+        self._remember(entries, version)
+        if self.persist and entries:
+            self._save_persistent(session, entries, version)
+
+    def _remember(self, entries:dict, version:str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for key, entry in entries.items():
+                self._entries[(version, key)] = entry
+                self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load_persistent(self, session, keys:set, version:str):
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), _PERSISTENT_BATCH_SIZE):
+            statement = select(PredictionCache.text_hash, PredictionCache.text, PredictionCache.sentiment_prediction).where(
+                PredictionCache.model_version == version,
+                PredictionCache.text_hash.in_(keys[start:start + _PERSISTENT_BATCH_SIZE]),
+            )
+            for text_hash, text, sentiment_prediction in session.execute(statement):
+                found[text_hash] = (text, sentiment_prediction)
+        return found
+
+    def _save_persistent(self, session, entries:dict, version:str):
+        engine = session.get_bind().engine
+        # Sorted, so concurrent uploads sharing texts take their key locks in the same order
+        rows = sorted(
+            ({"text_hash": key, "model_version": version, "text": cleaned, "sentiment_prediction": str(prediction)}
+             for key, (cleaned, prediction) in entries.items()),
+            key=lambda row: row["text_hash"],
+        )
+        if engine.dialect.name != "postgresql":
+            # SQLite has a single writer and the upload transaction holds it, the rows go with the upload
+            self._insert_rows(session, sqlite, rows)
+            return
+        # Own short transaction per chunk, the keys are never locked for the length of an upload
+        with Session(engine) as cache_session:
+            self._insert_rows(cache_session, postgresql, rows)
+            cache_session.commit()
+
+    def _insert_rows(self, session, dialect, rows:list):
+        for start in range(0, len(rows), _PERSISTENT_BATCH_SIZE):
+            # Another upload may have cached the same text meanwhile
+            session.execute(dialect.insert(PredictionCache).values(rows[start:start + _PERSISTENT_BATCH_SIZE]).on_conflict_do_nothing())
+
+    def invalidate(self, session=None, keep_version:str | None = None):
+        """Drops every entry, and the persistent ones of other versions than `keep_version`."""
+        with self._lock:
+            self._entries.clear()
+        if self.persist and session is not None:
+            session.execute(delete(PredictionCache).where(PredictionCache.model_version != keep_version))
+            session.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "persistent": self.persist,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+prediction_cache = LRUPredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_PERSIST)
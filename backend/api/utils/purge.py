@@ -0,0 +1,58 @@
+import os
+from dotenv import load_dotenv
+from datetime import datetime
+import uuid
+
+from sqlmodel import Session, select
+from sqlalchemy import delete, update
+
+from api.db.AIResponse import AiResponse
+from api.db.AIResponseTags import AiResponseTags
+from api.db.Uploads import Uploads
+from api.db.SentimentRollup import SentimentRollup
+from api.db.Jobs import Jobs
+from api.enum.JobKind import JobKind
+
+load_dotenv()
+
+# Rows removed per transaction, so a purge never holds the table for long
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 5000))
+
+class TagNotFound(Exception):
+    pass
+
+def tag_upload_query(user_id:uuid.UUID, tag:str):
+    return select(AiResponseTags.upload_id).where(AiResponseTags.user_id == user_id, AiResponseTags.tag == tag)
+
+def mark_tag_deleted(session:Session, user_id:uuid.UUID, tag:str):
+    """
+    Hides a tag right away and returns the purge job of its rows, on the
+    caller transaction. The tag and its rollup go now, both are a handful of
+    rows; the upload is only flagged, its rows are left to the job.
+    """
+    upload_id = session.exec(tag_upload_query(user_id, tag)).first()
+    if upload_id is None:
+        raise TagNotFound(f"Tag {tag} not founded")
+
+    session.execute(update(Uploads).where(Uploads.id == upload_id).values(deleted_at=datetime.now()))
+    session.execute(delete(AiResponseTags).where(AiResponseTags.upload_id == upload_id))
+    session.execute(delete(SentimentRollup).where(SentimentRollup.user_id == user_id, SentimentRollup.tag == tag))
+
+    job = Jobs(user_id=user_id, kind=JobKind.purge.value, tag=tag, upload_id=upload_id)
+    session.add(job)
+    return job
+
+def upload_rows_batch(upload_id:int, batch_size:int = PURGE_BATCH_SIZE):
+    batch = select(AiResponse.id).where(AiResponse.upload_id == upload_id).limit(batch_size)
+    return delete(AiResponse).where(AiResponse.id.in_(batch.scalar_subquery()))
+
+def delete_upload_rows(session:Session, upload_id:int, batch_size:int = PURGE_BATCH_SIZE):
+    """Deletes up to `batch_size` rows of an upload. Returns the rows deleted."""
+    return session.execute(upload_rows_batch(upload_id, batch_size)).rowcount
+
+def purge_batch(session:Session, upload_id:int, batch_size:int = PURGE_BATCH_SIZE):
+    """Deletes up to `batch_size` rows of a deleted upload, and the upload once none is left. Returns the rows deleted."""
+    deleted = delete_upload_rows(session, upload_id, batch_size)
+    if not deleted:
+        session.execute(delete(Uploads).where(Uploads.id == upload_id))
+    return deleted
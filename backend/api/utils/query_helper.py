@@ -1,19 +1,68 @@
-#Esse arquivo foi criado com o auxílio de IA
-from api.utils.operators import convert_text_to_operator
+from functools import lru_cache
 
-def build_where_clause(**filters):
-    where_clause_parts = []
+from sqlmodel import select
+from sqlalchemy import DateTime, Integer, bindparam, func, tuple_
 
-    for column, value in filters.items():
-        if isinstance(value, dict):
-            operator = value.get("operator")
-            val = value.get("value")
-            if operator and val:
-                where_clause_parts.append(f"{column} {convert_text_to_operator(operator)} '{val}'")
-        else:
-            list_formatted = [f"'{i}'" for i in value ]
-            where_clause_parts.append(f"{column} IN ({','.join(list_formatted)})")
+from api.db.AIResponse import AiResponse
+from api.db.AIResponseTags import AiResponseTags
+from api.db.Uploads import Uploads
+from api.enum.DateOperator import DateOperator
+from api.utils.operators import convert_date_operator
 
-    where_clause = "WHERE " + " AND ".join(where_clause_parts) if where_clause_parts else ""
+def _filter_conditions(date_operator:DateOperator | None, sentiment:bool, tags:bool):
+    # Rows of a deleted tag wait for the purge job, hidden from here on; rows of
+    # an archived one are read from its file while the archive job deletes them
+    conditions = [AiResponse.user_id == bindparam("user_id"), Uploads.deleted_at == None, Uploads.archived_at == None]
+    if date_operator:
+        conditions.append(convert_date_operator(date_operator)(AiResponse.consulted_query_date, bindparam("date", type_=DateTime)))
+    if sentiment:
+        conditions.append(AiResponse.sentiment_prediction.in_(bindparam("sentiments", expanding=True)))
+    if tags:
+        conditions.append(AiResponseTags.tag.in_(bindparam("tags", expanding=True)))
+    return conditions
 
-    return where_clause
\ No newline at end of file
+# Statements only depend on which filters are set, never on their values, so
+# each shape is built once and its compiled form is reused from the engine cache
+
+@lru_cache(maxsize=None)
+def build_filter_query(date_operator:DateOperator | None, sentiment:bool, tags:bool, cursor:bool):
+    """
+    Page of a user's feedback ordered by (consulted_query_date, id).
+
+    Bound parameters: user_id, limit, date, sentiments, tags, and
+    cursor_date/cursor_id when `cursor` is set or offset otherwise.
+    """
+    statement = (
+        select(AiResponse.consulted_query_date, AiResponse.sentiment_prediction, AiResponse.text, AiResponseTags.tag, AiResponse.id)
+        .outerjoin(AiResponseTags, AiResponse.upload_id == AiResponseTags.upload_id)
+        .outerjoin(Uploads, AiResponse.upload_id == Uploads.id)
+        .where(*_filter_conditions(date_operator, sentiment, tags))
+        .order_by(AiResponse.consulted_query_date, AiResponse.id)
+        .limit(bindparam("limit", type_=Integer))
+    )
+    if cursor:
+        return statement.where(
+            tuple_(AiResponse.consulted_query_date, AiResponse.id) > tuple_(bindparam("cursor_date", type_=DateTime), bindparam("cursor_id", type_=Integer))
+        )
+    return statement.offset(bindparam("offset", type_=Integer))
+
+@lru_cache(maxsize=None)
+def build_filter_count(date_operator:DateOperator | None, sentiment:bool, tags:bool):
+    return (
+        select(func.count())
+        .select_from(AiResponse)
+        .outerjoin(AiResponseTags, AiResponse.upload_id == AiResponseTags.upload_id)
+        .outerjoin(Uploads, AiResponse.upload_id == Uploads.id)
+        .where(*_filter_conditions(date_operator, sentiment, tags))
+    )
+
+@lru_cache(maxsize=None)
+def build_export_query(date_operator:DateOperator | None, sentiment:bool, tags:bool):
+    """Every row matching the filters, in the same order as build_filter_query."""
+    return (
+        select(AiResponse.consulted_query_date, AiResponse.sentiment_prediction, AiResponse.text, AiResponseTags.tag)
+        .outerjoin(AiResponseTags, AiResponse.upload_id == AiResponseTags.upload_id)
+        .outerjoin(Uploads, AiResponse.upload_id == Uploads.id)
+        .where(*_filter_conditions(date_operator, sentiment, tags))
+        .order_by(AiResponse.consulted_query_date, AiResponse.id)
+    )
@@ -1,7 +1,19 @@
+from fastapi import HTTPException, status
+
+from api.utils.ingest import LOCKED_RETRY_AFTER
+
 def unique_constraint_message(erro):
     string_error = str(erro)
     dots_position = string_error.find(":")
     break_line_position = string_error.find("\n")
     dot_between_position = string_error.find(".", dots_position)
     column_name = string_error[dot_between_position + 1:break_line_position].capitalize()
-    return f"{column_name} already registered. Choose another one"
\ No newline at end of file
+    return f"{column_name} already registered. Choose another one"
+
+def database_busy():
+    # Another upload holds the SQLite database until it commits, the client tries again later
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Another upload is being stored, try again later",
+        headers={"Retry-After": str(LOCKED_RETRY_AFTER)},
+    )
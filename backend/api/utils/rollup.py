@@ -0,0 +1,54 @@
+from collections import Counter
+import uuid
+
+from sqlmodel import Session, select
+from sqlalchemy import func, delete
+
+from api.db.AIResponse import AiResponse
+from api.db.AIResponseTags import AiResponseTags
+from api.db.SentimentRollup import SentimentRollup
+from api.utils.archive import archived_rollup_rows
+
+def rollup_query(user_id:uuid.UUID):
+    return select(SentimentRollup.tag, SentimentRollup.sentiment, SentimentRollup.count).where(SentimentRollup.user_id == user_id)
+
+def add_to_rollup(session:Session, user_id:uuid.UUID, tag:str, counts:Counter):
+    """Adds the sentiment counts of an upload, on the caller transaction."""
+    for sentiment, count in counts.items():
+        row = session.get(SentimentRollup, (user_id, tag, sentiment))
+        if row is None:
+            session.add(SentimentRollup(user_id=user_id, tag=tag, sentiment=sentiment, count=count))
+        else:
+            row.count += count
+
+def rebuild_rollup(session:Session, user_id:uuid.UUID | None = None):
+    """Recounts the rollup from airesponse and the archives, for every user or only `user_id`. Returns the rows written."""
+    statement = (
+        select(AiResponse.user_id, AiResponseTags.tag, AiResponse.sentiment_prediction, func.count())
+        .join(AiResponseTags, AiResponse.upload_id == AiResponseTags.upload_id)
+        .group_by(AiResponse.user_id, AiResponseTags.tag, AiResponse.sentiment_prediction)
+    )
+    clear = delete(SentimentRollup)
+    if user_id is not None:
+        statement = statement.where(AiResponse.user_id == user_id)
+        clear = clear.where(SentimentRollup.user_id == user_id)
+
+    session.execute(clear)
+    rows = [
+        {"user_id": row_user_id, "tag": tag, "sentiment": sentiment, "count": count}
+        for row_user_id, tag, sentiment, count in session.execute(statement)
+    ]
+    # Archived uploads have no rows left on airesponse, they are counted from their files
+    rows.extend(archived_rollup_rows(session, user_id))
+    session.bulk_insert_mappings(SentimentRollup, rows)
+    session.commit()
+    return len(rows)
+
+if __name__ == "__main__":
+    # Backfills the rollup of data stored before it existed: python -m api.utils.rollup [user_id]
+    import sys
+    from api.db import engine, create_all_table_and_db
+    create_all_table_and_db()
+    with Session(engine) as session:
+        written = rebuild_rollup(session, uuid.UUID(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print(f"{written} rollup rows written")
@@ -0,0 +1,126 @@
+import os
+from dotenv import load_dotenv
+from functools import lru_cache
+import re
+
+from sqlmodel import select
+from sqlalchemy import bindparam, column, func, literal_column, table, text
+
+from api.db.AIResponse import AiResponse
+from api.db.AIResponseTags import AiResponseTags
+from api.db.Uploads import Uploads
+from api.enum.DateOperator import DateOperator
+from api.utils.query_helper import _filter_conditions
+from ml_model.preprocess import clear_text
+
+load_dotenv()
+
+# Postgres text search configuration. Stored texts are cleaned English, so the
+# default stems words the same way SQLite's porter tokenizer does
+TEXT_SEARCH_CONFIG = os.getenv('TEXT_SEARCH_CONFIG', 'english')
+
+if not re.fullmatch(r"\w+", TEXT_SEARCH_CONFIG):
+    raise ValueError(f"Invalid TEXT_SEARCH_CONFIG: {TEXT_SEARCH_CONFIG}")
+
+FTS_TABLE = "airesponse_fts"
+POSTGRES_INDEX = "ix_airesponse_text_search"
+
+_SQLITE_INDEX = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(text, content='airesponse', content_rowid='id', tokenize='porter unicode61')",
+    # Inserts are indexed by index_upload, one statement per upload instead of a trigger run per row
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON airesponse BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF text ON airesponse BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+_POSTGRES_INDEX = [
+    # Computed by Postgres on every insert, COPY included; adding it fills the existing rows
+    f"ALTER TABLE airesponse ADD COLUMN IF NOT EXISTS text_search tsvector GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}'::regconfig, coalesce(text, ''))) STORED",
+    f"CREATE INDEX IF NOT EXISTS {POSTGRES_INDEX} ON airesponse USING GIN (text_search)",
+]
+
+def create_text_search_index(connection):
+    """Creates the full-text index of airesponse.text and fills it with the rows already stored."""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}).first()
+        for statement in _SQLITE_INDEX:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        for statement in _POSTGRES_INDEX:
+            connection.execute(text(statement))
+
+def check_text_search_index(connection):
+    """
+    Startup side of create_text_search_index. The SQLite index is created
+    here; on Postgres adding the column rewrites airesponse, so it is only
+    looked up and left to `python -m api.utils.text_search`.
+    """
+    if connection.dialect.name == "sqlite":
+        create_text_search_index(connection)
+    elif connection.dialect.name == "postgresql":
+        if connection.execute(text("SELECT to_regclass(:name)"), {"name": POSTGRES_INDEX}).scalar() is None:
+            print("airesponse has no text search index, /find fails until `python -m api.utils.text_search` is run")
+
+def index_upload(session, upload_id:int):
+    """Adds the rows of an upload to the SQLite index, on the ingest transaction. Postgres computes its own."""
+    if session.get_bind().dialect.name == "sqlite":
+        session.execute(text(f"INSERT INTO {FTS_TABLE}(rowid, text) SELECT id, text FROM airesponse WHERE upload_id = :upload_id"), {"upload_id": upload_id})
+
+def keyword_query(keywords:list[str]):
+    """
+    Full-text query matching any of `keywords`, each one as a phrase. Keywords
+    are cleaned like the stored texts; returns None when nothing is left.
+    """
+    # Cleaned text only has ascii letters and spaces, nothing to escape in either syntax
+    phrases = [f'"{phrase}"' for phrase in dict.fromkeys(clear_text(keyword) for keyword in keywords) if phrase]
+    if not phrases:
+        return None
+    return " OR ".join(phrases)
+
+@lru_cache(maxsize=None)
+def build_search_query(dialect:str, date_operator:DateOperator | None, sentiment:bool, tags:bool):
+    """
+    Page of a user's feedback matching the `query` bound parameter, best
+    matches first. Other bound parameters: user_id, limit, offset, date,
+    sentiments and tags, as on build_filter_query.
+    """
+    if dialect == "postgresql":
+        search_vector = literal_column("airesponse.text_search")
+        # websearch syntax: quoted phrases joined by OR, as keyword_query writes them
+        search_query = func.websearch_to_tsquery(literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig"), bindparam("query"))
+        rank = func.ts_rank(search_vector, search_query)
+        statement = select(AiResponse.consulted_query_date, AiResponse.sentiment_prediction, AiResponse.text, AiResponseTags.tag, rank.label("rank")).where(search_vector.op("@@")(search_query))
+        order = rank.desc()
+    else:
+        fts = table(FTS_TABLE, column("rowid"), column("rank"))
+        # bm25 is lower for better matches
+        statement = (
+            select(AiResponse.consulted_query_date, AiResponse.sentiment_prediction, AiResponse.text, AiResponseTags.tag, (-fts.c.rank).label("rank"))
+            .join(fts, fts.c.rowid == AiResponse.id)
+            .where(literal_column(FTS_TABLE).op("MATCH")(bindparam("query")))
+        )
+        order = fts.c.rank
+    return (
+        statement
+        .outerjoin(AiResponseTags, AiResponse.upload_id == AiResponseTags.upload_id)
+        .outerjoin(Uploads, AiResponse.upload_id == Uploads.id)
+        .where(*_filter_conditions(date_operator, sentiment, tags))
+        .order_by(order, AiResponse.id)
+        .limit(bindparam("limit"))
+        .offset(bindparam("offset"))
+    )
+
+if __name__ == "__main__":
+    # Run once on a database created before the keyword search, during a maintenance window: python -m api.utils.text_search
+    from api.db import engine, create_all_table_and_db
+    create_all_table_and_db()
+    with engine.begin() as connection:
+        create_text_search_index(connection)
+    print("text search index ready")
@@ -1,9 +1,9 @@
-from fastapi import Header, HTTPException
-from typing import Annotated
-
 import os 
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
+from collections import OrderedDict
+import threading
+import time
 
 from passlib.context import CryptContext
 import jwt
@@ -13,6 +13,9 @@ load_dotenv()
 ALGORITHM = os.getenv('ALGORITHM')
 SECRET_KEY = os.getenv('SECRET_KEY')
 ACCESS_TOKEN_EXPIRE_MINUTES = 3600 * 24
+# Verified tokens kept per API process, and for how long at most before being verified again
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
 
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
 
@@ -29,13 +32,70 @@ def create_token(data:object):
     payload.update({"exp" : expiration})
     return jwt.encode(payload, key=SECRET_KEY, algorithm=ALGORITHM)
 
+class VerifiedTokenCache:
+    """
+    Claims of tokens whose signature was already verified. An entry lives
+    TOKEN_CACHE_TTL seconds at most and never past the token `exp`, the least
+    recently used ones are evicted once `max_size` is reached.
+    """
+    def __init__(self, max_size:int, ttl:int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, token:str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[token]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token:str, claims:dict):
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, int(claims["exp"]))
+        with self._lock:
+            self._entries[token] = (expires_at, claims)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+token_cache = VerifiedTokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
 def decode_token(token:str):
-    return jwt.decode(token.removeprefix("Bearer ").removeprefix("bearer "), key=SECRET_KEY, algorithms=[ALGORITHM])
-
-def protected_endpoint(Authorization: Annotated[str, Header()]):
-    token = Authorization.removeprefix("bearer ").removeprefix("Bearer ")
-    try :
-        decode_token(token=token)
-    except :
-        raise HTTPException(status_code=400, detail="Invalid token")
-    return token
\ No newline at end of file
+    token = token.removeprefix("Bearer ").removeprefix("bearer ")
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, key=SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.put(token, claims)
+    # A copy, so a handler changing the claims doesn't change the cached ones
+    return dict(claims)
@@ -0,0 +1,37 @@
+import pandas as pd
+
+class MissingColumnError(ValueError):
+    pass
+
+def read_xlsx_column(file, column:str, chunk_size:int):
+    """
+    Yields DataFrames of at most `chunk_size` rows with the `column` column
+    of the first sheet, named by its header row.
+
+    The sheet is streamed by openpyxl's read-only mode and only the cells of
+    that column are asked for, the other ones are never turned into values.
+    """
+    # Only needed by this format, kept off the worker startup
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(max_row=1, values_only=True), None)
+        if header is None:
+            return
+        names = [str(name) for name in header]
+        if column not in names:
+            raise MissingColumnError(f"The file has no '{column}' column")
+        position = names.index(column) + 1
+
+        buffer = []
+        for (value,) in sheet.iter_rows(min_row=2, min_col=position, max_col=position, values_only=True):
+            buffer.append(value)
+            if len(buffer) == chunk_size:
+                yield pd.DataFrame({column: buffer})
+                buffer = []
+        if buffer:
+            yield pd.DataFrame({column: buffer})
+    finally:
+        workbook.close()
@@ -0,0 +1,89 @@
+"""
+Insert throughput of classified rows: ORM bulk_insert_mappings against
+bulk_insert_frame (COPY on Postgres, executemany on SQLite).
+
+Frames are built the way ingest_file builds them, in chunks of
+INGEST_CHUNK_SIZE, and every run is rolled back. Point DATABASE_URL to a
+scratch database.
+
+Run from the backend folder:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_bulk_load --rows 100000
+    python -m benchmarks.bench_bulk_load --rows 1000000
+"""
+import argparse
+import datetime
+import time
+import uuid
+
+import pandas as pd
+from sqlmodel import Session
+
+from api.db import engine, create_all_table_and_db
+from api.db.AIResponse import AiResponse
+from api.db.Uploads import Uploads
+from api.utils.bulk_load import bulk_insert_frame
+from api.utils.ingest import INGEST_CHUNK_SIZE
+from benchmarks.bench_preprocess import synthetic_texts
+
+SENTIMENTS = ["negativo", "neutro", "positivo"]
+
+def build_chunks(rows:int, chunk_size:int, user_id:uuid.UUID, upload_id:int):
+    texts = synthetic_texts(rows)
+    today = datetime.datetime.now()
+    chunks = []
+    for start in range(0, rows, chunk_size):
+        df = pd.DataFrame({"text": texts[start:start + chunk_size].reset_index(drop=True)})
+        df["sentiment_prediction"] = [SENTIMENTS[i % 3] for i in range(start, start + len(df))]
+        df["consulted_query_date"] = today
+        df["user_id"] = user_id
+        df["related_key"] = f"{str(user_id)}{str(today)}"
+        df["model_version"] = "bench"
+        df["upload_id"] = upload_id
+        chunks.append(df)
+    return chunks
+
+def orm_insert(session, df:pd.DataFrame):
+    session.bulk_insert_mappings(AiResponse, df.to_dict(orient='records'))
+
+def frame_insert(session, df:pd.DataFrame):
+    bulk_insert_frame(session, AiResponse.__table__, df)
+
+def timed(insert, chunks):
+    with Session(engine) as session:
+        start = time.perf_counter()
+        for df in chunks:
+            insert(session, df)
+        session.flush()
+        elapsed = time.perf_counter() - start
+        session.rollback()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    create_all_table_and_db()
+    user_id = uuid.uuid4()
+    with Session(engine) as session:
+        upload = Uploads(user_id=user_id, consulted_query_date=datetime.datetime.now(), model_version="bench")
+        session.add(upload)
+        session.commit()
+        upload_id = upload.id
+
+    chunks = build_chunks(args.rows, args.chunk_size, user_id, upload_id)
+    orm_time = timed(orm_insert, chunks)
+    frame_time = timed(frame_insert, chunks)
+
+    with Session(engine) as session:
+        session.delete(session.get(Uploads, upload_id))
+        session.commit()
+
+    print(f"dialect: {engine.dialect.name}, rows: {args.rows}, chunk size: {args.chunk_size}")
+    print(f"bulk_insert_mappings {orm_time:8.3f}s  {args.rows / orm_time:12,.0f} rows/s")
+    print(f"bulk_insert_frame    {frame_time:8.3f}s  {args.rows / frame_time:12,.0f} rows/s")
+    print(f"speedup: {orm_time / frame_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Latency of GET /api/users/me while uploads and logins are in flight.
+
+The app is served in-process through httpx's ASGI transport, so a route that
+blocks the event loop shows up straight on the p99 of /users/me. Point
+DATABASE_URL to a scratch database, the uploads are kept there.
+
+Run from the backend folder:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_concurrency
+    python -m benchmarks.bench_concurrency --uploaders 2 --rows 20000 --max-ratio 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+from api.main import app
+from api.db import create_all_table_and_db
+from api.utils.create_admin import create_admin, ADMIN_PASSWORD
+from benchmarks.bench_preprocess import synthetic_texts
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return statistics.median(latencies), latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+
+async def probe(client, headers, stop:asyncio.Event, interval:float):
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/users/me", headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        await asyncio.sleep(interval)
+    return latencies
+
+async def uploader(client, headers, csv:bytes, uploads:int):
+    for _ in range(uploads):
+        response = await client.post("/api/search/input?stream=true", files={"file": (f"bench-{uuid.uuid4().hex}.csv", csv, "text/csv")}, headers=headers)
+        response.raise_for_status()
+
+async def login(client, logins:int):
+    for _ in range(logins):
+        response = await client.post("/api/auth/login", json={"email": "admin@admin.com", "password": ADMIN_PASSWORD})
+        response.raise_for_status()
+
+async def measure(client, headers, interval:float, load=None, duration:float = 2.0):
+    stop = asyncio.Event()
+    probing = asyncio.create_task(probe(client, headers, stop, interval))
+    if load:
+        await asyncio.gather(*load)
+    else:
+        await asyncio.sleep(duration)
+    stop.set()
+    return await probing
+
+async def run(args):
+    create_all_table_and_db()
+    create_admin()
+    csv = ("Text\n" + "\n".join(synthetic_texts(args.rows))).encode()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post("/api/auth/login", json={"email": "admin@admin.com", "password": ADMIN_PASSWORD})
+        response.raise_for_status()
+        headers = {"Authorization": response.json()["access_token"]}
+
+        idle = await measure(client, headers, args.interval)
+        started = time.perf_counter()
+        loaded = await measure(client, headers, args.interval, load=[
+            *(uploader(client, headers, csv, args.uploads) for _ in range(args.uploaders)),
+            *(login(client, args.logins) for _ in range(args.login_clients)),
+        ])
+        elapsed = time.perf_counter() - started
+
+    idle_p50, idle_p99 = percentiles(idle)
+    loaded_p50, loaded_p99 = percentiles(loaded)
+    print(f"load: {args.uploaders}x{args.uploads} uploads of {args.rows} rows, {args.login_clients}x{args.logins} logins in {elapsed:.1f}s")
+    print(f"/users/me idle    p50 {idle_p50:7.1f}ms  p99 {idle_p99:7.1f}ms  ({len(idle)} requests)")
+    print(f"/users/me loaded  p50 {loaded_p50:7.1f}ms  p99 {loaded_p99:7.1f}ms  ({len(loaded)} requests)")
+    # Floor on the idle p99, a sub-millisecond baseline would make any ratio fail
+    ratio = loaded_p99 / max(idle_p99, 5.0)
+    print(f"p99 ratio {ratio:.2f}")
+    if args.max_ratio and ratio > args.max_ratio:
+        raise SystemExit(f"p99 of /users/me grew {ratio:.2f}x under load, above {args.max_ratio}x")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--uploaders", type=int, default=1)
+    parser.add_argument("--uploads", type=int, default=3)
+    parser.add_argument("--login-clients", type=int, default=2)
+    parser.add_argument("--logins", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--max-ratio", type=float, default=None)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-row latency and batch throughput of model.predict(vectorizer.transform(...))
+against the exported linear table scorer.
+
+Run from the backend folder:
+    python -m benchmarks.bench_linear_table --rows 20000
+    python -m benchmarks.bench_linear_table --version v1
+"""
+import argparse
+import os
+import statistics
+import time
+
+import joblib
+import numpy as np
+
+from api.utils.model_registry import MODELS_DIR, MODEL_FILE, VECTORIZER_FILE
+from benchmarks.bench_preprocess import synthetic_texts
+from ml_model.linear_table import LinearTableScorer, LINEAR_TABLE_FILE, export_linear_table
+from ml_model.preprocess import clear_text_series
+
+def per_row_latency(predict, texts):
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        predict(text)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--version", default=open(os.path.join(MODELS_DIR, "CURRENT")).read().strip())
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--latency-rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    version_dir = os.path.join(MODELS_DIR, args.version)
+    model = joblib.load(os.path.join(version_dir, MODEL_FILE))
+    vectorizer = joblib.load(os.path.join(version_dir, VECTORIZER_FILE))
+    table_path = os.path.join(version_dir, LINEAR_TABLE_FILE)
+    if not os.path.isdir(table_path):
+        export_linear_table(model, vectorizer, table_path)
+    scorer = LinearTableScorer(table_path)
+
+    texts = clear_text_series(synthetic_texts(args.rows)).tolist()
+
+    start = time.perf_counter()
+    expected = model.predict(vectorizer.transform(texts))
+    sklearn_batch = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = scorer.predict(texts)
+    table_batch = time.perf_counter() - start
+    one_by_one = np.array([scorer.predict_one(text) for text in texts], dtype=object)
+    if not (np.array_equal(expected, batch) and np.array_equal(expected, one_by_one)):
+        raise SystemExit("Linear table predictions differ from the model")
+
+    sample = texts[:args.latency_rows]
+    sklearn_p50, sklearn_p99 = per_row_latency(lambda text: model.predict(vectorizer.transform([text])), sample)
+    table_p50, table_p99 = per_row_latency(scorer.predict_one, sample)
+
+    print(f"version: {args.version}  rows: {len(texts)} (predictions identical)")
+    print(f"per row    sklearn  p50 {sklearn_p50:8.1f}us  p99 {sklearn_p99:8.1f}us")
+    print(f"per row    table    p50 {table_p50:8.1f}us  p99 {table_p99:8.1f}us")
+    print(f"batch      sklearn  {len(texts) / sklearn_batch:12,.0f} rows/s")
+    print(f"batch      table    {len(texts) / table_batch:12,.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Throughput of clear_text (row by row) against clear_text_series (batch).
+
+Run from the backend folder:
+    python -m benchmarks.bench_preprocess --rows 100000
+    python -m benchmarks.bench_preprocess --csv feedback.csv
+"""
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from ml_model.preprocess import clear_text, clear_text_series
+
+WORDS = [
+    "great", "product", "the", "and", "it", "was", "not", "good", "LOOOVE", "okaay", "terrible",
+    "delivery", "café", "über", "<br>", "<b>nice</b>", "http://shop.com/item?id=1", "www.store.com",
+    "!!!", "5/5", "would", "buy", "again", "br", "😀", "don't", "São", "Paulo", "very", "bad",
+]
+
+def synthetic_texts(rows:int, seed:int = 42):
+    rng = random.Random(seed)
+    return pd.Series([" ".join(rng.choices(WORDS, k=rng.randint(3, 60))) for _ in range(rows)])
+
+def timed(func, texts):
+    start = time.perf_counter()
+    result = func(texts)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--csv", help="CSV file with a 'Text' column to use instead of synthetic data")
+    args = parser.parse_args()
+
+    texts = pd.read_csv(args.csv)['Text'].astype(str) if args.csv else synthetic_texts(args.rows)
+
+    row_by_row, row_time = timed(lambda t: t.apply(clear_text), texts)
+    batch, batch_time = timed(clear_text_series, texts)
+
+    if not row_by_row.equals(batch):
+        raise SystemExit("clear_text_series output differs from clear_text")
+
+    print(f"rows: {len(texts)}")
+    print(f"clear_text        {row_time:8.3f}s  {len(texts) / row_time:12,.0f} rows/s")
+    print(f"clear_text_series {batch_time:8.3f}s  {len(texts) / batch_time:12,.0f} rows/s")
+    print(f"speedup: {row_time / batch_time:.2f}x (outputs identical)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Parse time and peak memory of the upload readers on a wide spreadsheet:
+every column parsed (pd.read_csv, openpyxl read-only) against read_chunks,
+which only reads the Text column.
+
+Run from the backend folder:
+    python -m benchmarks.bench_readers --rows 50000 --columns 40
+    python -m benchmarks.bench_readers --xlsx export.xlsx
+"""
+import argparse
+import gzip
+import io
+import time
+import tracemalloc
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from api.utils.ingest import read_chunks, TEXT_COLUMN, INGEST_CHUNK_SIZE
+from benchmarks.bench_preprocess import synthetic_texts
+
+def wide_frame(rows:int, columns:int):
+    texts = synthetic_texts(rows)
+    frame = {f"column_{index}": range(rows) if index % 2 else [f"value {row} {index}" for row in range(rows)] for index in range(columns - 1)}
+    frame = pd.DataFrame(frame)
+    frame.insert(columns // 2, TEXT_COLUMN, texts)
+    return frame
+
+def xlsx_bytes(frame:pd.DataFrame):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(frame.columns))
+    for row in frame.itertuples(index=False):
+        sheet.append(list(row))
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def full_xlsx_chunks(file, chunk_size:int):
+    # Every cell of every row, as uploads were read before
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    columns = [str(column) for column in next(rows)]
+    buffer = []
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) == chunk_size:
+            yield pd.DataFrame(buffer, columns=columns)
+            buffer = []
+    if buffer:
+        yield pd.DataFrame(buffer, columns=columns)
+    workbook.close()
+
+def measure(read):
+    start = time.perf_counter()
+    texts = [text for chunk in read() for text in chunk[TEXT_COLUMN]]
+    elapsed = time.perf_counter() - start
+    # Second pass for memory, tracemalloc slows the reading down a lot
+    tracemalloc.start()
+    for _ in read():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return texts, elapsed, peak
+
+def compare(name:str, full, projected):
+    full_texts, full_time, full_peak = measure(full)
+    projected_texts, projected_time, projected_peak = measure(projected)
+    if full_texts != projected_texts:
+        raise SystemExit(f"{name}: Text column differs between readers")
+    print(f"{name:8} all columns {full_time:7.2f}s {full_peak / 1e6:8.1f}MB   Text only {projected_time:7.2f}s {projected_peak / 1e6:8.1f}MB   {full_time / projected_time:5.1f}x faster, {full_peak / projected_peak:5.1f}x less memory")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--columns", type=int, default=40)
+    parser.add_argument("--xlsx", help="XLSX file with a 'Text' column to use instead of synthetic data")
+    args = parser.parse_args()
+
+    if args.xlsx:
+        with open(args.xlsx, "rb") as file:
+            xlsx = file.read()
+    else:
+        frame = wide_frame(args.rows, args.columns)
+        csv = frame.to_csv(index=False).encode()
+        xlsx = xlsx_bytes(frame)
+        print(f"{args.rows} rows x {args.columns} columns, csv {len(csv) / 1e6:.1f}MB, xlsx {len(xlsx) / 1e6:.1f}MB")
+        compare("csv", lambda: pd.read_csv(io.BytesIO(csv), chunksize=INGEST_CHUNK_SIZE), lambda: read_chunks(io.BytesIO(csv), ".csv"))
+        compressed = gzip.compress(csv)
+        compare("csv.gz", lambda: pd.read_csv(io.BytesIO(compressed), chunksize=INGEST_CHUNK_SIZE, compression="gzip"), lambda: read_chunks(io.BytesIO(compressed), ".csv.gz"))
+    compare("xlsx", lambda: full_xlsx_chunks(io.BytesIO(xlsx), INGEST_CHUNK_SIZE), lambda: read_chunks(io.BytesIO(xlsx), ".xlsx"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Cold start budget of an API worker: the time a fresh interpreter takes to
+import ml_model.preprocess, to import the app, and to load the active model
+afterwards. Every run is a new process, so nothing is cached in memory but
+the OS page cache; the median of `--repeat` runs is kept, with the modules
+that took longest to import.
+
+Results are compared with benchmarks/baselines/startup.json and the run
+fails when a step got slower than `--tolerance` times the baseline; `--save`
+writes the run as the new baseline.
+
+Run from the backend folder:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_startup
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_startup --repeat 10 --save
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "startup.json")
+
+# Run by each fresh interpreter, prints the seconds of every step as JSON
+_CHILD = """
+import json, time
+start = time.perf_counter()
+import ml_model.preprocess
+preprocess = time.perf_counter()
+import api.main
+app = time.perf_counter()
+from api.utils.model_registry import get_active_model
+get_active_model()
+model = time.perf_counter()
+print(json.dumps({"import_preprocess": preprocess - start, "import_app": app - start, "load_model": model - app, "total": model - start}))
+"""
+
+def run_once():
+    output = subprocess.run([sys.executable, "-c", _CHILD], capture_output=True, text=True, check=True).stdout
+    return {step: seconds * 1000 for step, seconds in json.loads(output.splitlines()[-1]).items()}
+
+def slowest_imports(count:int):
+    """Modules with the largest cumulative import time, as reported by -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import api.main"], capture_output=True, text=True, check=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative) / 1000, name.strip()))
+    return [{"module": name, "cumulative_ms": round(ms, 1)} for ms, name in sorted(modules, reverse=True)[:count]]
+
+def run(args):
+    runs = [run_once() for _ in range(args.repeat)]
+    return {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "steps": {step: round(statistics.median(result[step] for result in runs), 1) for step in runs[0]},
+        "slowest_imports": slowest_imports(args.top),
+    }
+
+def regressions(results:dict, baseline:dict, tolerance:float, min_delta_ms:float):
+    found = []
+    for step, ms in results["steps"].items():
+        previous = baseline["steps"].get(step)
+        if previous is not None and ms > previous * tolerance and ms - previous > min_delta_ms:
+            found.append(f"{step}: {previous}ms -> {ms}ms")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters started, the median of each step is kept")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to report")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown against the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=50.0, help="increases below this are never a regression")
+    args = parser.parse_args()
+
+    results = run(args)
+    for step, ms in results["steps"].items():
+        print(f"{step:18} {ms:9.1f}ms")
+    print("slowest imports:")
+    for module in results["slowest_imports"]:
+        print(f"  {module['cumulative_ms']:9.1f}ms  {module['module']}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, save one with --save")
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    found = regressions(results, baseline, args.tolerance, args.min_delta_ms)
+    if found:
+        raise SystemExit(f"slower than {args.baseline} ({baseline['created_at']}):\n  " + "\n  ".join(found))
+    print(f"within {args.tolerance}x of {args.baseline} ({baseline['created_at']})")
+
+if __name__ == "__main__":
+    main()
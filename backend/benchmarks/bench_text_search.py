@@ -0,0 +1,85 @@
+"""
+Keyword search on the full-text index against a LIKE '%keyword%' scan.
+
+Stores `--rows` synthetic classified rows for a new user on DATABASE_URL,
+`--rare-rows` of them holding a rare word, times both searches for each
+keyword and deletes the rows afterwards. Common words match most rows, so
+ranking them costs more than the first LIKE rows found.
+
+Run from the backend folder:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_text_search --rows 1000000
+"""
+import argparse
+import datetime
+import time
+import uuid
+
+from sqlmodel import Session, select, delete
+from sqlalchemy import bindparam
+
+from api.db import engine, create_all_table_and_db
+from api.db.AIResponse import AiResponse
+from api.db.Uploads import Uploads
+from api.utils.bulk_load import bulk_insert_frame
+from api.utils.text_search import keyword_query, build_search_query, index_upload
+from benchmarks.bench_bulk_load import build_chunks
+
+RARE_WORD = "zeppelin"
+KEYWORDS = [RARE_WORD, "sao paulo", "delivery"]
+
+def like_query():
+    return (
+        select(AiResponse.consulted_query_date, AiResponse.sentiment_prediction, AiResponse.text)
+        .where(AiResponse.user_id == bindparam("user_id"), AiResponse.text.like(bindparam("pattern")))
+        .order_by(AiResponse.consulted_query_date, AiResponse.id)
+        .limit(bindparam("limit"))
+    )
+
+def timed(session, statement, params, repeat:int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rows = session.execute(statement, params).all()
+    return (time.perf_counter() - start) / repeat, len(rows)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rare-rows", type=int, default=5)
+    args = parser.parse_args()
+
+    create_all_table_and_db()
+    user_id = uuid.uuid4()
+    with Session(engine) as session:
+        upload = Uploads(user_id=user_id, consulted_query_date=datetime.datetime.now(), model_version="bench")
+        session.add(upload)
+        session.commit()
+        upload_id = upload.id
+
+        rare_every = max(args.rows // max(args.rare_rows, 1), 1)
+        chunks = build_chunks(args.rows, 10000, user_id, upload_id)
+        for offset, df in zip(range(0, args.rows, 10000), chunks):
+            df.loc[(df.index + offset) % rare_every == rare_every // 2, "text"] += f" {RARE_WORD}"
+        start = time.perf_counter()
+        for df in chunks:
+            bulk_insert_frame(session, AiResponse.__table__, df)
+        stored = time.perf_counter()
+        index_upload(session, upload_id)
+        session.commit()
+        print(f"dialect: {engine.dialect.name}, {args.rows} rows stored in {stored - start:.2f}s and indexed in {time.perf_counter() - stored:.2f}s")
+
+        try:
+            search = build_search_query(engine.dialect.name, None, False, False)
+            for keyword in KEYWORDS:
+                params = {"user_id": user_id, "limit": args.limit}
+                like_time, _ = timed(session, like_query(), {**params, "pattern": f"%{keyword}%"}, args.repeat)
+                index_time, found = timed(session, search, {**params, "offset": 0, "query": keyword_query([keyword])}, args.repeat)
+                print(f"{keyword!r:12} LIKE {like_time * 1000:9.1f}ms  full-text {index_time * 1000:9.1f}ms  ({found} rows)")
+        finally:
+            session.execute(delete(AiResponse).where(AiResponse.upload_id == upload_id))
+            session.execute(delete(Uploads).where(Uploads.id == upload_id))
+            session.commit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Query plans of the statements behind /search/input/group/, /search/input/filter/,
+/search/input/export/ and /search/input/delete/{tag}, on the database of
+DATABASE_URL.
+
+The statements are the ones the API runs, compiled for the engine dialect
+with their parameters rendered inline, so the plans follow the code.
+
+Run from the backend folder:
+    python -m benchmarks.explain_queries
+"""
+from datetime import datetime
+import uuid
+
+from sqlalchemy import text
+
+from api.db import engine, create_all_table_and_db
+from api.enum.DateOperator import DateOperator
+from api.utils.query_helper import build_filter_query, build_filter_count, build_export_query
+from api.utils.archive import build_archived_uploads_query
+from api.utils.purge import tag_upload_query, upload_rows_batch
+from api.utils.rollup import rollup_query
+
+USER_ID = uuid.UUID(int=0)
+
+# The params the routes bind, with every filter set
+FILTER_PARAMS = {
+    "user_id": USER_ID,
+    "date": datetime(2025, 1, 1),
+    "sentiments": ["positivo"],
+    "tags": ["tag"],
+    "limit": 11,
+    "offset": 0,
+    "cursor_date": datetime(2025, 1, 1),
+    "cursor_id": 1,
+}
+
+STATEMENTS = {
+    "group": rollup_query(USER_ID),
+    "filter: page": build_filter_query(DateOperator.gte, True, True, False),
+    "filter: cursor": build_filter_query(DateOperator.gte, True, True, True),
+    "filter: total": build_filter_count(DateOperator.gte, True, True),
+    "filter: archived uploads": build_archived_uploads_query(DateOperator.gte, True),
+    "export": build_export_query(DateOperator.gte, True, True),
+    "delete: upload of the tag": tag_upload_query(USER_ID, "tag"),
+    "delete: purge batch": upload_rows_batch(1),
+}
+
+def compile_statement(statement):
+    bound = statement.compile(dialect=engine.dialect).params
+    params = {name: value for name, value in FILTER_PARAMS.items() if name in bound}
+    if params:
+        # The filter statements leave their values to execute time
+        statement = statement.params(params)
+    return str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+def main():
+    create_all_table_and_db()
+    explain = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as connection:
+        for name, statement in STATEMENTS.items():
+            print(name)
+            for row in connection.execute(text(f"{explain} {compile_statement(statement)}")):
+                # SQLite: (id, parent, notused, detail), Postgres: (plan line,)
+                print(f"    {row[-1]}")
+            connection.rollback()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Production server, run from the backend folder:
+    gunicorn -c gunicorn.conf.py api.main:app
+
+The app and the active model are loaded once by the master and every worker
+is forked from it, so workers (started or restarted) import nothing and
+answer their first upload without loading the model. Models with a linear
+table are served from memory-mapped arrays, so the workers and the inference
+pool processes share their pages.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+def when_ready(server):
+    # The app is already imported (preload_app), nothing has connected to the database yet
+    from api.utils.model_registry import get_active_model
+    try:
+        server.log.info(f"Model {get_active_model().version} preloaded")
+    except Exception as e:
+        # Workers load it on their first upload instead
+        server.log.warning(f"Model not preloaded: {e}")
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
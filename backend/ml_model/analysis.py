@@ -0,0 +1,14 @@
+# Dataset exploration helpers, kept apart from preprocess so the API never imports them
+from collections import Counter
+
+import pandas as pd
+
+def get_most_common_words_table(df,sentiment_label, n=10):
+    texts = df[df["Sentiment"] == sentiment_label]['Text']
+    all_words = ' '.join(texts).split()
+    word_counts = Counter(all_words).most_common(n)
+    
+    if word_counts:
+        return pd.DataFrame(word_counts,columns=["Word", 'Frequency'])
+    else:
+        return pd.DataFrame(columns=['Word','Frequency'])
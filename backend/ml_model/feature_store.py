@@ -0,0 +1,145 @@
+"""
+Cleaned and tokenized training datasets, saved once as sparse count shards and
+reused by every training run until the dataset or the preprocessing changes.
+
+features/<dataset hash>-p<PREPROCESS_VERSION>/
+    manifest.json
+    vocabulary.npy      every token of the dataset, by first appearance
+    shard-00000.npz     token counts (CSR data, indices, indptr) and labels of SHARD_ROWS rows
+"""
+import os
+import hashlib
+import json
+import shutil
+import struct
+import zipfile
+from datetime import datetime
+
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import CountVectorizer
+
+from preprocess import clear_text_series, PREPROCESS_VERSION
+from streaming import read_labeled_chunks
+
+FEATURES_DIR = os.getenv('FEATURES_DIR', 'features')
+SHARD_ROWS = 50000
+
+MANIFEST_FILE = 'manifest.json'
+VOCABULARY_FILE = 'vocabulary.npy'
+
+def dataset_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def features_path(path):
+    return os.path.join(FEATURES_DIR, f"{dataset_hash(path)}-p{PREPROCESS_VERSION}")
+
+def _shard_counts(texts):
+    # Same tokens as a default CountVectorizer, over the text cleaned like the API cleans it
+    vectorizer = CountVectorizer()
+    try:
+        return vectorizer.fit_transform(clear_text_series(texts)), vectorizer.get_feature_names_out()
+    except ValueError:
+        # Nothing left of any text of the shard after cleaning
+        return csr_matrix((len(texts), 0), dtype=np.int64), []
+
+def build_features(path, shard_rows=SHARD_ROWS):
+    """Cleans, tokenizes and stores the dataset on `path`, unless it is already stored. Returns its folder."""
+    target = features_path(path)
+    if os.path.isfile(os.path.join(target, MANIFEST_FILE)):
+        return target
+
+    temporary = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    vocabulary = {}
+    rows = 0
+    shards = 0
+    for chunk in read_labeled_chunks(path, shard_rows):
+        counts, tokens = _shard_counts(chunk['Text'].astype(str))
+        # Shard columns -> dataset columns, new tokens are appended
+        columns = np.array([vocabulary.setdefault(token, len(vocabulary)) for token in tokens], dtype=np.int32)
+        # Saved uncompressed, so every array can be mapped straight from the file
+        np.savez(
+            os.path.join(temporary, f"shard-{shards:05d}.npz"),
+            data=counts.data.astype(np.int32),
+            indices=columns[counts.indices],
+            indptr=counts.indptr.astype(np.int64),
+            labels=chunk['Sentiment'].to_numpy().astype(str),
+        )
+        rows += len(chunk)
+        shards += 1
+
+    np.save(os.path.join(temporary, VOCABULARY_FILE), np.array(list(vocabulary), dtype=str))
+    with open(os.path.join(temporary, MANIFEST_FILE), 'w') as file:
+        json.dump({
+            "dataset": os.path.basename(path),
+            "rows": rows,
+            "shards": shards,
+            "preprocess_version": PREPROCESS_VERSION,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }, file, indent=2)
+    try:
+        os.replace(temporary, target)
+    except OSError:
+        # Stored by another run meanwhile
+        shutil.rmtree(temporary, ignore_errors=True)
+    return target
+
+def _mapped_npz(path):
+    """Arrays of an uncompressed .npz, memory mapped from the file instead of read."""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as file:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed, it can't be mapped")
+            # The member starts after its local header: 30 bytes, the name and an extra field of their own lengths
+            file.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', file.read(4))
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(file)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(file)
+            name = info.filename[:-len('.npy')]
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=file.tell(), shape=shape, order='F' if fortran_order else 'C')
+    return arrays
+
+class FeatureSet:
+    """Stored features of a dataset, shards mapped from disk."""
+    def __init__(self, folder):
+        with open(os.path.join(folder, MANIFEST_FILE)) as file:
+            self.manifest = json.load(file)
+        self.tokens = np.load(os.path.join(folder, VOCABULARY_FILE))
+        self.shards = [_mapped_npz(os.path.join(folder, f"shard-{shard:05d}.npz")) for shard in range(self.manifest["shards"])]
+
+    def _shard_matrix(self, shard):
+        return csr_matrix((shard['data'], shard['indices'], shard['indptr']), shape=(len(shard['labels']), len(self.tokens)))
+
+    def matrix(self, max_features=None):
+        """
+        (X, y, vocabulary) over the `max_features` most frequent tokens, with
+        the columns sorted by token like on CountVectorizer(max_features=...).
+        `vocabulary` is the {token: column} to serve the model with.
+        """
+        totals = np.zeros(len(self.tokens), dtype=np.int64)
+        for shard in self.shards:
+            totals += np.bincount(shard['indices'], weights=shard['data'], minlength=len(self.tokens)).astype(np.int64)
+        keep = np.arange(len(self.tokens))
+        if max_features is not None and max_features < len(keep):
+            keep = np.argsort(-totals, kind='stable')[:max_features]
+        keep = keep[np.argsort(self.tokens[keep])]
+
+        X = vstack([self._shard_matrix(shard)[:, keep] for shard in self.shards], format='csr')
+        y = np.concatenate([shard['labels'] for shard in self.shards])
+        return X, y, {str(token): column for column, token in enumerate(self.tokens[keep])}
+
+def load_features(path):
+    """Features of the dataset on `path`, cleaned and tokenized first when they aren't stored yet."""
+    return FeatureSet(build_features(path))
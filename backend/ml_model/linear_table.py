@@ -0,0 +1,145 @@
+import os
+import re
+import shutil
+import sys
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import coo_matrix
+
+# Folder of plain .npy arrays, so the scorer memory maps them instead of reading them
+LINEAR_TABLE_FILE = 'linear_table'
+
+def _linear_weights(model):
+    # LinearSVC / linear models keep coef_ and intercept_, MultinomialNB the equivalent log probabilities
+    if hasattr(model, 'coef_') and hasattr(model, 'intercept_'):
+        return np.asarray(model.coef_, dtype=np.float64), np.asarray(model.intercept_, dtype=np.float64)
+    if hasattr(model, 'feature_log_prob_') and hasattr(model, 'class_log_prior_'):
+        return np.asarray(model.feature_log_prob_, dtype=np.float64), np.asarray(model.class_log_prior_, dtype=np.float64)
+    raise ValueError(f"{type(model).__name__} is not a linear model")
+
+def export_linear_table(model, vectorizer, path):
+    """
+    Folds the vectorizer vocabulary and the model weights into one token -> per-class weight table.
+    """
+    params = vectorizer.get_params()
+    if (params['analyzer'] != 'word' or params['ngram_range'] != (1, 1) or params['binary']
+            or params['preprocessor'] or params['tokenizer'] or params['stop_words'] or params['strip_accents']):
+        raise ValueError("Only plain word unigram count vectorizers can be exported")
+
+    weights, bias = _linear_weights(model)
+    tokens = np.empty(len(vectorizer.vocabulary_), dtype=object)
+    for token, column in vectorizer.vocabulary_.items():
+        tokens[column] = token
+    tokens = tokens.astype(str)
+    # Sorted for np.searchsorted, with the model column of every token
+    order = np.argsort(tokens, kind='stable')
+
+    arrays = {
+        'tokens': tokens[order],
+        'columns': order.astype(np.int64),
+        # Row per model column, so a token's weights for every class sit next to each other
+        'weights': np.ascontiguousarray(weights.T),
+        'bias': bias,
+        'classes': np.asarray(model.classes_).astype(str),
+        'token_pattern': np.array(params['token_pattern']),
+        'lowercase': np.array(params['lowercase']),
+    }
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(temporary_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(temporary_path, f"{name}.npy"), array, allow_pickle=False)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(temporary_path, path)
+
+class LinearTableScorer:
+    """
+    Classifies text straight from an exported table.
+
+    The tokens and weights are memory mapped, so every process serving the
+    same version (API workers and inference pool) shares their pages, and
+    tokens are looked up with np.searchsorted on the sorted token array.
+
+    Scores are accumulated in column order as count * weight and the bias is
+    added last, the same operations sklearn runs on the sparse matrix, so the
+    predictions are the same as model.predict(vectorizer.transform(texts)).
+    """
+    def __init__(self, path):
+        def load(name, mmap_mode='r'):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+
+        self.tokens = load('tokens')
+        self.columns = load('columns')
+        self.weights = load('weights')
+        # Small enough to read
+        self.bias = load('bias', None)
+        self.classes = load('classes', None).astype(object)
+        self.token_pattern = re.compile(str(load('token_pattern', None)))
+        self.lowercase = bool(load('lowercase', None))
+        self.binary = self.weights.shape[1] == 1
+
+    def _columns(self, tokens):
+        """Model column of each of `tokens`, -1 for the ones off the vocabulary."""
+        columns = np.full(len(tokens), -1, dtype=np.int64)
+        if tokens and len(self.tokens):
+            # Not cast to the width of the vocabulary, that would cut longer tokens into matches
+            tokens = np.asarray(tokens)
+            positions = np.minimum(np.searchsorted(self.tokens, tokens), len(self.tokens) - 1)
+            found = self.tokens[positions] == tokens
+            columns[found] = self.columns[positions[found]]
+        return columns
+
+    def _findall(self, text):
+        return self.token_pattern.findall(text.lower() if self.lowercase else text)
+
+    def _label(self, scores):
+        if self.binary:
+            return self.classes[int(scores[0] > 0)]
+        return self.classes[max(range(len(scores)), key=scores.__getitem__)]
+
+    def predict_one(self, text):
+        """Single text, no matrix is built."""
+        columns = self._columns(self._findall(text))
+        counts = sorted(Counter(columns[columns >= 0].tolist()).items())
+        # The weight rows of the text in one read of the mapped table
+        weight_rows = self.weights[[column for column, _ in counts]].tolist()
+        scores = [0.0] * len(self.bias)
+        for (_, count), weight in zip(counts, weight_rows):
+            for k in range(len(scores)):
+                scores[k] += count * weight[k]
+        return self._label([score + bias for score, bias in zip(scores, self.bias.tolist())])
+
+    def predict(self, texts):
+        """Batch of texts through a single sparse product."""
+        # Every distinct token of the batch is looked up once
+        token_ids = {}
+        ids = []
+        rows = []
+        n_rows = 0
+        for n_rows, text in enumerate(texts, start=1):
+            text_ids = [token_ids.setdefault(token, len(token_ids)) for token in self._findall(text)]
+            ids.extend(text_ids)
+            rows.extend([n_rows - 1] * len(text_ids))
+        columns = self._columns(list(token_ids))[np.asarray(ids, dtype=np.intp)]
+        found = columns >= 0
+        # Converting to csr sums the repeated tokens and sorts the columns of every row
+        X = coo_matrix(
+            (np.ones(int(found.sum())), (np.asarray(rows, dtype=np.int32)[found], columns[found].astype(np.int32))),
+            shape=(n_rows, self.weights.shape[0]),
+        ).tocsr()
+        scores = X @ self.weights + self.bias
+        if self.binary:
+            return self.classes[(scores[:, 0] > 0).astype(int)]
+        return self.classes[np.argmax(scores, axis=1)]
+
+if __name__ == "__main__":
+    # Exports the table of an already trained version: python -m ml_model.linear_table ml_model/model/v1
+    import joblib
+    version_dir = sys.argv[1]
+    export_linear_table(
+        joblib.load(os.path.join(version_dir, 'modelo_sentimento.pkl')),
+        joblib.load(os.path.join(version_dir, 'vectorizer.pkl')),
+        os.path.join(version_dir, LINEAR_TABLE_FILE),
+    )
+    print(f"tabela salva em {os.path.join(version_dir, LINEAR_TABLE_FILE)}")
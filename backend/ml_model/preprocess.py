@@ -1,17 +1,10 @@
-import pandas as pd 
-import nltk 
+import os
 import re
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.tokenize import wordpunct_tokenize
-nltk.download('stopwords')
-nltk.download('punkt')
-import matplotlib.pyplot as plt 
-from collections import Counter
-import unicodedata 
-
-
+import unicodedata
 
+# nltk's English stopwords, shipped with the module: importing nltk costs most of
+# the API start and nltk.download needs the network on every fresh container
+STOPWORDS_FILE = os.path.join(os.path.dirname(__file__), 'resources', 'stopwords_english.txt')
 
 corrections = {
     "loove": "love",
@@ -21,7 +14,11 @@ corrections = {
     "wwbuythiscom": "buy",
     "idk": "i dont know"
 }
-stop_words = set(stopwords.words('english'))
+with open(STOPWORDS_FILE) as file:
+    stop_words = set(file.read().split())
+
+# Bump whenever clear_text changes its output, cached training features are rebuilt then
+PREPROCESS_VERSION = 1
 
 def clear_text(text):
     text = text.lower()
@@ -32,21 +29,64 @@ def clear_text(text):
     text = re.sub(r'\bbr\b', '', text)
     text = re.sub(r'[^a-zA-Z\s]', '', text)
     text = re.sub(r'\s+', ' ', text).strip()
-    word =wordpunct_tokenize(text)
+    # Only letters and whitespace are left, where wordpunct_tokenize is a plain split
+    word = text.split()
     filtered_word = [p for p in word if p not in stop_words]
     return ' '.join(filtered_word)
 
 
 
-def get_most_common_words_table(df,sentiment_label, n=10):
-    texts = df[df["Sentiment"] == sentiment_label]['Text'],
-    all_words = ' '.join(texts).split()
-    word_counts = Counter(all_words).most_common(n)
-    
-    if word_counts:
-        return pd.DataFrame(word_counts,columns=["Word", 'Frequency'])
-    else:
-        return pd.DataFrame(columns=['Word','Frequency'])
-    
+# Each step of clear_text runs once over every text of the batch joined by this
+# separator. None of the patterns can match across a newline, so every text is
+# cleaned exactly as clear_text would do it alone. Texts that already contain
+# the sentinel char are cleaned one by one.
+_BATCH_SENTINEL = "\x00"
+_BATCH_SEPARATOR = f"\n{_BATCH_SENTINEL}\n"
+
+_REPEATED_CHAR_PATTERN = re.compile(r'(.)\1\1+')
+_URL_PATTERN = re.compile(r'http\S+|www\S+|https\S+')
+_HTML_TAG_PATTERN = re.compile(r'<.*?>')
+# Same as \bbr\b, but starting with a literal lets the regex engine skip ahead
+_BR_PATTERN = re.compile(r'br(?!\w)(?<!\wbr)')
+# Ascii chars that are neither letters, whitespace (as matched by \s) nor the sentinel
+_NON_LETTER_BYTES = bytes(
+    c for c in range(128)
+    if not (chr(c).isalpha() or chr(c).isspace() or chr(c) == _BATCH_SENTINEL)
+)
+
+def clear_text_series(texts, batch_size=10000):
+    """
+    Batch version of clear_text for a whole column.
+
+    Returns a Series (aligned with `texts` when it is one) whose values are
+    byte-identical to `texts.apply(clear_text)`.
+    """
+    # Imported here, clear_text alone doesn't need pandas
+    import pandas as pd
+
+    index = texts.index if isinstance(texts, pd.Series) else None
+    texts = list(texts)
+    cleaned = []
+    for start in range(0, len(texts), batch_size):
+        cleaned.extend(_clear_text_batch(texts[start:start + batch_size]))
+    return pd.Series(cleaned, index=index, dtype=object)
+
+def _clear_text_batch(texts):
+    if not texts:
+        return []
+    text = _BATCH_SEPARATOR.join(texts)
+    if text.count(_BATCH_SENTINEL) != len(texts) - 1:
+        with_sentinel = {i for i, t in enumerate(texts) if _BATCH_SENTINEL in t}
+        cleaned = iter(_clear_text_batch([t for i, t in enumerate(texts) if i not in with_sentinel]))
+        return [clear_text(t) if i in with_sentinel else next(cleaned) for i, t in enumerate(texts)]
 
+    text = unicodedata.normalize("NFKD", text.lower()).encode('ascii','ignore').decode('ascii')
+    text = _REPEATED_CHAR_PATTERN.sub(r'\1\1', text)
+    text = _URL_PATTERN.sub('', text)
+    text = _HTML_TAG_PATTERN.sub('', text)
+    text = _BR_PATTERN.sub('', text)
+    text = text.encode('ascii').translate(None, _NON_LETTER_BYTES).decode('ascii')
 
+    # Only letters and whitespace are left, so collapsing spaces and wordpunct_tokenize come down to one split
+    filtered_word = [p for p in text.split() if p not in stop_words]
+    return [t.strip(' ') for t in ' '.join(filtered_word).split(_BATCH_SENTINEL)]
@@ -1,27 +1,12 @@
-import pandas as pd 
+from streaming import read_labeled_chunks, stratified_sample
 
-df = pd.read_csv("dataset/Reviews.csv")
+PER_CLASS = 40000
 
-df = df[["Text",'Score']].dropna()
-
-def map_score(score):
-    if score <= 2:
-        return 'negativo'
-    elif score == 3:
-        return 'neutro'
-    else:
-        return 'positivo'
-    
-df['Sentiment'] = df['Score'].apply(map_score)    
-
-df_reduced = pd.concat([
-    df[df['Sentiment'] == 'positivo'].sample(n=40000,),
-    df[df['Sentiment'] == 'negativo'].sample(n=40000),
-    df[df['Sentiment'] == 'neutro'].sample(n=40000)
-])
+# Streamed in chunks, only the sample is kept in memory however large Reviews.csv is
+df_reduced = stratified_sample(read_labeled_chunks("dataset/Reviews.csv"), PER_CLASS)[['Text', 'Score', 'Sentiment']]
 
 df_reduced.to_csv('dataset/reduced_reviews.csv',index = False)
 
 
-print(df[['Text', 'Score', 'Sentiment']].head(10))
-print(df_reduced['Sentiment'].value_counts())
\ No newline at end of file
+print(df_reduced.head(10))
+print(df_reduced['Sentiment'].value_counts())
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+SENTIMENTS = ['negativo', 'neutro', 'positivo']
+
+def map_score(scores):
+    # 1-2 stars negative, 3 neutral, 4-5 positive
+    scores = np.asarray(scores)
+    return np.select([scores <= 2, scores == 3], ['negativo', 'neutro'], 'positivo')
+
+def read_labeled_chunks(path, chunk_size=100000):
+    """
+    Yields the Text and Sentiment columns of a reviews CSV in DataFrames of at
+    most `chunk_size` rows. Sentiment is taken from the file when it has one,
+    else mapped from Score; the other columns are never parsed.
+    """
+    columns = ('Text', 'Score', 'Sentiment')
+    for chunk in pd.read_csv(path, usecols=lambda column: column in columns, chunksize=chunk_size):
+        if 'Sentiment' not in chunk.columns:
+            chunk = chunk.dropna(subset=['Score'])
+            chunk['Sentiment'] = map_score(chunk['Score'])
+        yield chunk.dropna(subset=['Text', 'Sentiment'])
+
+def shuffled(chunks, buffer_rows, seed=None):
+    """
+    Yields the rows of `chunks` in chunks of the same size, drawn at random
+    from a buffer of `buffer_rows` rows. Rows sorted on the input (by class,
+    product or date) come out mixed with the ones up to `buffer_rows` away.
+    """
+    rng = np.random.default_rng(seed)
+    buffer = None
+    size = 0
+    for chunk in chunks:
+        size = max(size, len(chunk))
+        buffer = chunk if buffer is None else pd.concat([buffer, chunk], ignore_index=True)
+        if len(buffer) > buffer_rows:
+            order = rng.permutation(len(buffer))
+            yield buffer.iloc[order[:size]].reset_index(drop=True)
+            buffer = buffer.iloc[order[size:]].reset_index(drop=True)
+    if buffer is not None:
+        buffer = buffer.iloc[rng.permutation(len(buffer))].reset_index(drop=True)
+        for start in range(0, len(buffer), max(size, 1)):
+            yield buffer.iloc[start:start + max(size, 1)]
+
+class StratifiedReservoir:
+    """
+    Uniform sample of at most `per_class` rows of each class out of a stream
+    of chunks, holding only the sample and the chunk being added.
+
+    Every row gets a random key and the `per_class` smallest keys of each
+    class are kept, so every row of a class has the same chance to be in the
+    sample wherever it is on the stream.
+    """
+    def __init__(self, per_class, label_column='Sentiment', seed=None):
+        self.per_class = per_class
+        self.label_column = label_column
+        self.rng = np.random.default_rng(seed)
+        self.rows = None
+        self.seen = 0
+
+    def add(self, chunk):
+        self.seen += len(chunk)
+        chunk = chunk.assign(_key=self.rng.random(len(chunk)))
+        rows = chunk if self.rows is None else pd.concat([self.rows, chunk], ignore_index=True)
+        self.rows = rows.sort_values('_key').groupby(self.label_column, sort=False).head(self.per_class)
+
+    def sample(self):
+        if self.rows is None:
+            return pd.DataFrame()
+        return self.rows.sort_values([self.label_column, '_key']).drop(columns='_key').reset_index(drop=True)
+
+def stratified_sample(chunks, per_class, label_column='Sentiment', seed=None):
+    reservoir = StratifiedReservoir(per_class, label_column, seed)
+    for chunk in chunks:
+        reservoir.add(chunk)
+    return reservoir.sample()
@@ -0,0 +1,55 @@
+"""
+Cross-validated grid over max_features and the C of LinearSVC, on the stored
+features of the dataset: it is cleaned and tokenized once, by the first run,
+and the fits of the grid run in parallel on --n-jobs processes.
+
+Run from the ml_model folder:
+    python sweep.py --max-features 2000 5000 10000 --C 0.1 0.5 1
+"""
+import argparse
+import time
+
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.svm import LinearSVC
+
+from feature_store import load_features
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', default='dataset/reduced_reviews.csv')
+    parser.add_argument('--max-features', type=int, nargs='+', default=[2000, 5000, 10000])
+    parser.add_argument('--C', type=float, nargs='+', default=[0.1, 0.5, 1.0])
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--scoring', default='f1_macro')
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    features = load_features(args.dataset)
+    print(f"features of {features.manifest['rows']} rows ready in {time.perf_counter() - start:.1f}s")
+
+    results = []
+    for max_features in args.max_features:
+        start = time.perf_counter()
+        X, y, _ = features.matrix(max_features)
+        search = GridSearchCV(
+            LinearSVC(dual=False),
+            {"C": args.C},
+            scoring=args.scoring,
+            cv=StratifiedKFold(args.folds, shuffle=True, random_state=args.seed),
+            n_jobs=args.n_jobs,
+        )
+        search.fit(X, y)
+        print(f"max_features={max_features}: {len(args.C) * args.folds} fits in {time.perf_counter() - start:.1f}s")
+        for params, mean, std in zip(search.cv_results_['params'], search.cv_results_['mean_test_score'], search.cv_results_['std_test_score']):
+            results.append((mean, std, max_features, params['C']))
+
+    print(f"\n{args.scoring:>10} {'std':>7} {'max_features':>13} {'C':>7}")
+    for mean, std, max_features, C in sorted(results, reverse=True):
+        print(f"{mean:>10.4f} {std:>7.4f} {max_features:>13} {C:>7g}")
+    _, _, max_features, C = max(results)
+    print(f"\nbest: max_features={max_features} C={C:g}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Streaming training: texts are hashed with HashingVectorizer, which has no
+vocabulary to fit, and a linear SVM (SGDClassifier with hinge loss) learns
+from one chunk at a time with partial_fit. Memory depends on the chunk size,
+the holdout and n_features, never on the number of rows.
+
+Run from the backend folder:
+    python -m ml_model.train_incremental --csv ml_model/dataset/Reviews.csv --balanced
+    python -m ml_model.train_incremental --csv ml_model/dataset/Reviews.csv --per-class 40000
+    python -m ml_model.train_incremental --csv labelled.csv --base <version>
+
+--base continues a version trained by this script on more labelled rows.
+Training needs human labels: the stored feedback only has the served
+model's own predictions, and learning from them would reinforce its errors.
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import classification_report
+
+from api.utils.model_registry import MODELS_DIR, MODEL_FILE, VECTORIZER_FILE
+from ml_model.preprocess import clear_text_series
+from ml_model.streaming import SENTIMENTS, StratifiedReservoir, read_labeled_chunks, stratified_sample, shuffled
+
+TRAINING_STATE_FILE = 'training_state.json'
+
+# One row out of this many is held out for the report instead of trained on
+HOLDOUT_EVERY = 10
+
+def new_model(n_features, alpha, class_weight=None, seed=None):
+    # Same tokens as the CountVectorizer of train_model.py; raw counts, like the served models
+    vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+    model = SGDClassifier(loss='hinge', alpha=alpha, class_weight=class_weight, random_state=seed)
+    return model, vectorizer
+
+def load_base(version):
+    """Model, vectorizer and training state of a version trained by this script."""
+    version_dir = os.path.join(MODELS_DIR, version)
+    # Loaded without mmap_mode: partial_fit updates the weights in place
+    model = joblib.load(os.path.join(version_dir, MODEL_FILE))
+    vectorizer = joblib.load(os.path.join(version_dir, VECTORIZER_FILE))
+    state_path = os.path.join(version_dir, TRAINING_STATE_FILE)
+    if not isinstance(vectorizer, HashingVectorizer) or not hasattr(model, 'partial_fit') or not os.path.isfile(state_path):
+        raise SystemExit(f"Version '{version}' wasn't trained by train_incremental, it can't be continued")
+    with open(state_path) as file:
+        return model, vectorizer, json.load(file)
+
+def class_weights(counts):
+    # Same as class_weight='balanced', which partial_fit can't compute on its own
+    total = sum(counts.values())
+    return {label: total / (len(counts) * count) for label, count in counts.items() if count}
+
+def csv_label_counts(path, chunk_size):
+    counts = dict.fromkeys(SENTIMENTS, 0)
+    for chunk in read_labeled_chunks(path, chunk_size):
+        for label, count in chunk['Sentiment'].value_counts().items():
+            counts[label] += int(count)
+    return counts
+
+def _cleaned(chunk):
+    # Cleaned as the API cleans uploads before classifying them
+    return pd.DataFrame({'Text': clear_text_series(chunk['Text'].astype(str)).values, 'Sentiment': chunk['Sentiment'].values})
+
+def csv_chunks(path, chunk_size):
+    for chunk in read_labeled_chunks(path, chunk_size):
+        yield _cleaned(chunk)
+
+def sample_chunks(path, per_class, chunk_size, seed=None):
+    """Stratified sample of the CSV, read in one pass and split in chunks."""
+    sample = stratified_sample(read_labeled_chunks(path, chunk_size), per_class, seed=seed)
+    for start in range(0, len(sample), chunk_size):
+        yield _cleaned(sample.iloc[start:start + chunk_size])
+
+def train(model, vectorizer, chunks, holdout:StratifiedReservoir):
+    """
+    Fits `model` on chunks of Text and Sentiment, one at a time. One row in
+    HOLDOUT_EVERY goes to `holdout` instead. Returns the rows trained on.
+    """
+    trained = 0
+    seen = 0
+    for chunk in chunks:
+        held_out = (np.arange(len(chunk)) + seen) % HOLDOUT_EVERY == 0
+        seen += len(chunk)
+        holdout.add(chunk[held_out])
+        chunk = chunk[~held_out]
+        if len(chunk):
+            model.partial_fit(vectorizer.transform(chunk['Text']), chunk['Sentiment'], classes=SENTIMENTS)
+            trained += len(chunk)
+            print(f"{trained} rows trained")
+    return trained
+
+def save_version(version, model, vectorizer, state):
+    version_dir = os.path.join(MODELS_DIR, version)
+    os.makedirs(version_dir, exist_ok=True)
+    joblib.dump(model, os.path.join(version_dir, MODEL_FILE))
+    joblib.dump(vectorizer, os.path.join(version_dir, VECTORIZER_FILE))
+    with open(os.path.join(version_dir, TRAINING_STATE_FILE), 'w') as file:
+        json.dump(state, file, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', required=True, help="labelled reviews CSV with Text and either Sentiment or Score")
+    parser.add_argument('--base', help="version to keep training instead of starting a new model")
+    parser.add_argument('--version', default=datetime.now().strftime("%Y%m%d%H%M%S"))
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--per-class', type=int, help="train on a stratified sample of this many rows per class instead of every row")
+    parser.add_argument('--balanced', action='store_true', help="weight the classes by their counts, read on a first pass")
+    parser.add_argument('--shuffle-buffer', type=int, default=200000, help="rows mixed together before training, SGD learns badly from rows sorted by class")
+    parser.add_argument('--n-features', type=int, default=2 ** 20)
+    parser.add_argument('--alpha', type=float, default=1e-5)
+    parser.add_argument('--holdout', type=int, default=30000, help="rows kept for the report, at most")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    state = {"base_version": args.base, "rows_trained": 0, "source": os.path.basename(args.csv)}
+    if args.base:
+        model, vectorizer, base_state = load_base(args.base)
+        state["rows_trained"] = base_state["rows_trained"]
+    else:
+        weights = class_weights(csv_label_counts(args.csv, args.chunk_size)) if args.balanced else None
+        model, vectorizer = new_model(args.n_features, args.alpha, weights, args.seed)
+
+    if args.per_class:
+        chunks = sample_chunks(args.csv, args.per_class, args.chunk_size, args.seed)
+    else:
+        chunks = csv_chunks(args.csv, args.chunk_size)
+
+    holdout = StratifiedReservoir(args.holdout // len(SENTIMENTS), seed=args.seed)
+    trained = train(model, vectorizer, shuffled(chunks, args.shuffle_buffer, args.seed), holdout)
+    if not trained:
+        raise SystemExit("No rows to train on")
+    state["rows_trained"] += trained
+
+    test = holdout.sample()
+    print("classification report:")
+    print(classification_report(test['Sentiment'], model.predict(vectorizer.transform(test['Text']))))
+
+    state["created_at"] = datetime.now().isoformat(timespec="seconds")
+    save_version(args.version, model, vectorizer, state)
+    print(f"modelo salvo: {args.version}")
+    print(f"activate it with POST /api/models/activate {{\"version\": \"{args.version}\"}}")
+
+if __name__ == "__main__":
+    main()
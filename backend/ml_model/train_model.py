@@ -1,17 +1,22 @@
-import pandas as pd 
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 from sklearn.feature_extraction.text import CountVectorizer
 import joblib
 import os 
+import sys
+from datetime import datetime
 from sklearn.svm import LinearSVC
-df = pd.read_csv('dataset/reduced_reviews.csv')
+from linear_table import export_linear_table, LINEAR_TABLE_FILE
+from feature_store import load_features
 
-vectorizer = CountVectorizer(max_features=5000)
+# Cleaned with clear_text_series like the API cleans uploads, and tokenized
+# once: later runs on the same dataset load the stored counts from features/
+features = load_features('dataset/reduced_reviews.csv')
 
-X = vectorizer.fit_transform(df["Text"])
+X, y, vocabulary = features.matrix(max_features=5000)
 
-y = df["Sentiment"]
+# Served on the stored vocabulary, same columns as X
+vectorizer = CountVectorizer(vocabulary=vocabulary).fit([])
 
 X_train, X_test , y_train, y_test = train_test_split(
     X, y, test_size= 0.3, random_state=42
@@ -26,10 +31,16 @@ print("classification report:")
 print (classification_report(y_test,y_pred))
 
 
-os.makedirs("model", exist_ok=True)
+# Each run is saved as a new version, the API keeps serving the one on model/CURRENT
+version = sys.argv[1] if len(sys.argv) > 1 else datetime.now().strftime("%Y%m%d%H%M%S")
+os.makedirs(f"model/{version}", exist_ok=True)
 
-joblib.dump(model, "model/modelo_sentimento.pkl")
+joblib.dump(model, f"model/{version}/modelo_sentimento.pkl")
 
-joblib.dump(vectorizer, "model/vectorizer.pkl")
+joblib.dump(vectorizer, f"model/{version}/vectorizer.pkl")
 
-print("modelo salvo")
\ No newline at end of file
+# Token -> per-class weights, used by the API instead of vectorizer + model
+export_linear_table(model, vectorizer, f"model/{version}/{LINEAR_TABLE_FILE}")
+
+print(f"modelo salvo: {version}")
+print(f"activate it with POST /api/models/activate {{\"version\": \"{version}\"}}")
\ No newline at end of file
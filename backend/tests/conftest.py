@@ -0,0 +1,24 @@
+import os
+import tempfile
+
+# Read by the api modules on import, so set before any test imports them
+_database_dir = tempfile.mkdtemp(prefix="feedai-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_database_dir, 'feedai.db')}")
+os.environ.setdefault("SECRET_KEY", "tests")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ADMIN_PASSWORD", "admin")
+
+import pytest
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def headers(client):
+    token = client.post("/api/auth/login", json={"email": "admin@admin.com", "password": "admin"}).json()["access_token"]
+    return {"Authorization": token}
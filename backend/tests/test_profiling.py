@@ -0,0 +1,43 @@
+import os
+import pstats
+
+import pytest
+
+from api.utils import metrics
+
+@pytest.fixture
+def profile_every_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(metrics, "PROFILE_SLOW_MS", 0)
+    monkeypatch.setattr(metrics, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+def upload(client, headers, tag:str):
+    return client.post("/api/search/input", files={"file": (f"{tag}.csv", "Text\ngreat product\nawful service\n")}, headers=headers)
+
+def upload_profiles(profile_dir):
+    return [os.path.join(profile_dir, name) for name in os.listdir(profile_dir) if "POST-api_search_input" in name]
+
+@pytest.mark.parametrize("per_thread", [True, False])
+def test_profiled_upload(client, headers, profile_every_request, monkeypatch, per_thread):
+    # per_thread=False is the path taken from Python 3.12 on
+    monkeypatch.setattr(metrics, "_PROFILER_PER_THREAD", per_thread)
+    assert upload(client, headers, f"profiled-{per_thread}").status_code == 201
+
+    profiles = upload_profiles(profile_every_request)
+    assert len(profiles) == 1
+    functions = {function for _, _, function in pstats.Stats(profiles[0]).stats}
+    if per_thread:
+        # The run_blocking work is merged into the request dump
+        assert "ingest_file" in functions
+
+def test_profiler_already_active(client, headers, profile_every_request, monkeypatch):
+    class ActiveProfiler:
+        # What cProfile raises on 3.12+ when another profiler is enabled
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(metrics.cProfile, "Profile", ActiveProfiler)
+    assert upload(client, headers, "profiler-active").status_code == 201
+    assert upload_profiles(profile_every_request) == []
+    assert not metrics._profile_lock.locked()
@@ -0,0 +1,35 @@
+import io
+
+from openpyxl import Workbook
+import pytest
+
+from api.utils.xlsx_reader import read_xlsx_column, MissingColumnError
+
+def xlsx_file(*rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+def read_texts(file, chunk_size:int = 10000):
+    return [value for chunk in read_xlsx_column(file, "Text", chunk_size) for value in chunk["Text"]]
+
+def test_attribute_like_text_and_empty_cell():
+    file = xlsx_file(["Text", "note"], [None, 'see cell r="A2" please'], ['ok', 'x'])
+    assert read_texts(file) == [None, 'ok']
+
+def test_text_column_not_first():
+    file = xlsx_file(["id", "Text"], [1, 'first'], [2, 'second'])
+    assert read_texts(file) == ['first', 'second']
+
+def test_chunks():
+    file = xlsx_file(["Text"], *[[f"text {index}"] for index in range(5)])
+    assert [len(chunk) for chunk in read_xlsx_column(file, "Text", 2)] == [2, 2, 1]
+
+def test_missing_column():
+    with pytest.raises(MissingColumnError):
+        read_texts(xlsx_file(["Other"], ["value"]))